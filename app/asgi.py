@@ -0,0 +1,407 @@
+"""
+asgi.py
+
+Async serving mode. Exposes the same routes as app.server as a Starlette ASGI app so an
+in-flight command no longer pins a server thread for the whole STT + LLM wait:
+LLM calls are awaited over httpx, while embedding, vector queries, STT and actions are
+CPU-bound and run in a bounded executor.
+
+Run with: python -m app.run --mode asgi [--workers N]
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.middleware import Middleware
+from starlette.requests import HTTPConnection
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+
+from app.config import (
+    ASGI_EXECUTOR_THREADS,
+    STT_PIPELINED,
+    STREAM_RECEIVE_TIMEOUT_SECONDS
+)
+from app.jarvis_logger import logger, set_trace, reset_trace, get_recent_logs
+from app.whisper_stt import transcribe, resolve_profile
+from app.llm_handler import retrieve_memory, query_llm_async
+from app.intent_router import route_intent
+from app.model_warmth import ensure_warm, warmth_status, start_keepalive, stop_keepalive
+from app.stt_pipeline import run_pipelined
+from app.stream_stt import StreamingTranscriber, StreamProtocolError, parse_control
+from app.audio_decode import decoded_audio
+from app.stt_pool import get_pool, STTQueueFull, STTJobTimeout
+from app import stt_telemetry
+from app.metrics import render_prometheus, should_profile, profile_block, run_attributed
+from app.vector_browse import parse_args, page_body, ndjson_lines, VectorQueryError
+from app import memory_manager
+from app.snapshot import export_tenant_snapshot
+from app.tenancy import (
+    requested_tenant,
+    requested_tenant_key,
+    set_request_tenant,
+    reset_tenant,
+    TenantError,
+    TenantAccessDenied
+)
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_EXECUTOR_THREADS, thread_name_prefix="asgi-worker")
+_http = {"client": None}
+
+
+async def offload(fn, *args, **kwargs):
+    """
+    Run blocking work in the executor, carrying over context variables.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, run_attributed, fn, *args, **kwargs))
+
+
+async def index(request):
+    return FileResponse(os.path.join(os.path.dirname(__file__), "voice.html"))
+
+
+async def preload_model(request):
+    previous = ensure_warm()
+    if previous == "warm":
+        logger.info("[LLM] → Model already warm, skipping preload.")
+    else:
+        logger.info("[LLM] → Triggered model preload in background")
+    return JSONResponse({**warmth_status(), "status": "already_running" if previous == "warm" else "preload_started"})
+
+
+async def model_status(request):
+    return JSONResponse(warmth_status())
+
+
+async def stt_statistics(request):
+    return JSONResponse(stt_telemetry.stats())
+
+
+async def stt_pool_metrics(request):
+    return JSONResponse(get_pool().metrics())
+
+
+async def metrics(request):
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _int_param(request, name):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+
+async def recent_logs(request):
+    return JSONResponse(get_recent_logs(_int_param(request, "since"), _int_param(request, "limit")))
+
+
+async def fetch_vectors(request):
+    try:
+        options = parse_args(request.query_params)
+    except VectorQueryError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if options["stream"]:
+        # Sync generator: Starlette pulls each page in its threadpool
+        return StreamingResponse(ndjson_lines(memory_manager.collection, options), media_type="application/x-ndjson")
+    try:
+        return JSONResponse(await offload(page_body, memory_manager.collection, options))
+    except Exception as e:
+        logger.error(f"[VECTOR] Failed to fetch entries: {e}")
+        return JSONResponse({"error": "Vector fetch failed"}, status_code=500)
+
+
+async def create_snapshot(request):
+    try:
+        return JSONResponse(await offload(export_tenant_snapshot, memory_manager.collection))
+    except Exception as e:
+        logger.error(f"[SNAPSHOT] Export failed: {e}")
+        return JSONResponse({"error": "Snapshot export failed"}, status_code=500)
+
+
+async def _run_command(text, timings, memory_slices=None):
+    """
+    Retrieval (executor) → LLM (awaited) → action (executor). Fills in timings.
+    """
+    if memory_slices is None:
+        retrieval_start = time.time()
+        memory_slices = await offload(retrieve_memory, text)
+        timings["retrieval"] = round(time.time() - retrieval_start, 3)
+    llm_start = time.time()
+    parsed = await query_llm_async(text, memory_slices, _http["client"])
+    action_start = time.time()
+    timings["llm"] = round(action_start - llm_start, 3)
+    result = await offload(route_intent, parsed)
+    timings["action"] = round(time.time() - action_start, 3)
+    return parsed, result
+
+
+def _transcribe_upload(audio_bytes, requested_profile, pipelined):
+    stt_start = time.time()
+    with decoded_audio(audio_bytes) as audio:
+        profile = resolve_profile(requested_profile, audio)
+        if pipelined:
+            return run_pipelined(audio, profile)
+        transcription = transcribe(audio, profile)
+        return transcription, None, {"mode": "sequential", "stt_profile": profile,
+                                     "stt": round(time.time() - stt_start, 3)}
+
+
+async def handle_stt(request):
+    form = await request.form()
+    # As on the Flask server, the upload form may name the tenant when the header and query string don't
+    if requested_tenant(request.headers, request.query_params) or not form.get("tenant"):
+        return await _handle_stt(request, form)
+    try:
+        token = set_request_tenant(form.get("tenant"), requested_tenant_key(request.headers, request.query_params, form))
+    except TenantError as e:
+        return JSONResponse({"error": str(e)}, status_code=_tenant_error_status(e))
+    try:
+        return await _handle_stt(request, form)
+    finally:
+        reset_tenant(token)
+
+
+async def _handle_stt(request, form):
+    overall_start = time.time()
+    logger.info("========== START JARVIS COMMAND ==========")
+
+    upload = form.get("audio")
+    if upload is None or isinstance(upload, str):
+        logger.warning("[STT] No audio received in /stt")
+        return JSONResponse({"error": "No audio file"}, status_code=400)
+    audio_bytes = await upload.read()
+    logger.info("[STT] Received audio input")
+
+    pipelined = str(form.get("pipelined", STT_PIPELINED)).lower() in ("1", "true", "yes")
+    try:
+        transcription, memory_slices, timings = await offload(
+            _transcribe_upload, audio_bytes, form.get("profile"), pipelined)
+    except (STTQueueFull, STTJobTimeout) as e:
+        logger.warning(f"[STT] → Rejected: {e}")
+        return JSONResponse({"error": f"STT busy, try again: {e}"}, status_code=503)
+    logger.info(f"[STT] STT stage complete in {timings.get('stt')} sec")
+
+    parsed, result = await _run_command(transcription, timings, memory_slices)
+    duration = round(time.time() - overall_start, 2)
+    logger.info(f"[ACTION] → Final Message: {result}")
+    logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
+
+    return JSONResponse({
+        "transcription": transcription,
+        "parsed": parsed,
+        "message": result,
+        "time_taken": duration,
+        "timings": timings
+    })
+
+
+async def handle_command(request):
+    overall_start = time.time()
+    logger.info("========== START JARVIS COMMAND ==========")
+
+    try:
+        data = await request.json()
+        user_input = data.get("command", "").strip()
+        logger.info(f"[STT] → Transcribed Text: {user_input}")
+
+        timings = {}
+        parsed, action_result = await _run_command(user_input, timings)
+        logger.info(f"[ACTION] → Final Message: {action_result}")
+        duration = round(time.time() - overall_start, 2)
+        logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
+
+        return JSONResponse({"message": action_result, "timings": timings})
+
+    except Exception as e:
+        logger.exception("Error in /command:")
+        return JSONResponse({"message": f"❌ Error: {str(e)}"}, status_code=500)
+
+
+async def handle_stt_stream(websocket):
+    """
+    Same protocol as the Flask /ws/stt endpoint (see app.server.handle_stt_stream).
+    """
+    await websocket.accept()
+    overall_start = time.time()
+    logger.info("========== START JARVIS COMMAND (stream) ==========")
+    ensure_warm()
+    session = StreamingTranscriber()
+
+    try:
+        while not session.ended:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), STREAM_RECEIVE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning("[STT] → Stream receive timed out")
+                break
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("text") is not None:
+                try:
+                    control = parse_control(message["text"])
+                except StreamProtocolError as e:
+                    logger.warning(f"[STT] → Rejected stream control message: {e}")
+                    await websocket.send_json({"type": "error", "message": str(e)})
+                    continue
+                if control["event"] == "start":
+                    session = StreamingTranscriber(control["sample_rate"], control["profile"])
+                elif control["event"] == "end":
+                    break
+                continue
+            partial = await offload(session.feed, message["bytes"])
+            if partial:
+                await websocket.send_json({"type": "partial", "text": partial})
+
+        transcription, stt_stats = await offload(session.finalize)
+        logger.info(f"[STT] → Result: {transcription}")
+        await websocket.send_json({"type": "transcript", "transcription": transcription, "stt": stt_stats})
+        if not transcription:
+            return
+
+        timings = {"mode": "stream", "stt_finalize": stt_stats["finalize_sec"]}
+        parsed, result = await _run_command(transcription, timings)
+        duration = round(time.time() - overall_start, 2)
+        logger.info(f"[ACTION] → Final Message: {result}")
+        logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
+        await websocket.send_json({
+            "type": "result",
+            "transcription": transcription,
+            "parsed": parsed,
+            "message": result,
+            "time_taken": duration,
+            "timings": timings
+        })
+    except WebSocketDisconnect:
+        logger.info("[STT] → Stream client disconnected")
+    finally:
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+
+
+async def startup():
+    _http["client"] = httpx.AsyncClient()
+    start_keepalive()
+    logger.info("========== SERVER STARTED (ASGI) ==========")
+
+
+async def shutdown():
+    logger.info("[SERVER] → Shutting down: draining executor and closing LLM client")
+    stop_keepalive()
+    if _http["client"] is not None:
+        await _http["client"].aclose()
+    _executor.shutdown(wait=True)
+
+
+routes = [
+    Route("/", index),
+    Route("/preload-model", preload_model, methods=["POST"]),
+    Route("/model-status", model_status, methods=["GET"]),
+    Route("/stt-stats", stt_statistics, methods=["GET"]),
+    Route("/stt-pool", stt_pool_metrics, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/logs", recent_logs, methods=["GET"]),
+    Route("/vectors", fetch_vectors, methods=["GET"]),
+    Route("/snapshot", create_snapshot, methods=["POST"]),
+    Route("/stt", handle_stt, methods=["POST"]),
+    Route("/command", handle_command, methods=["POST"]),
+    WebSocketRoute("/ws/stt", handle_stt_stream)
+]
+
+
+class ProfileMiddleware:
+    """
+    Attach the sampling profiler to HTTP requests that ask for it (X-Jarvis-Profile: 1
+    or ?trace_profile=1) or are randomly sampled. The event loop thread is sampled for
+    the whole request (so it also catches other requests' coroutines running in
+    between); executor and STT pool threads only while they run this request's work.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        requested = (headers.get(b"x-jarvis-profile") == b"1"
+                     or b"trace_profile=1" in scope.get("query_string", b"").split(b"&"))
+        with profile_block(scope["path"], should_profile(requested)) as result:
+            await self.app(scope, receive, send)
+        if result["path"]:
+            logger.info(f"[PROFILE] → {scope['path']}: written to {result['path']}")
+
+
+class TraceMiddleware:
+    """
+    Enable full payload logging for requests with X-Jarvis-Trace: 1 or ?trace=1.
+    The flag is a context variable, so offload() carries it into executor threads.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        traced = (headers.get(b"x-jarvis-trace") == b"1"
+                  or b"trace=1" in scope.get("query_string", b"").split(b"&"))
+        token = set_trace(traced)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_trace(token)
+
+
+def _tenant_error_status(error):
+    return 403 if isinstance(error, TenantAccessDenied) else 400
+
+
+class TenantMiddleware:
+    """
+    Scope each HTTP/WebSocket request to the tenant named by the tenant header or
+    ?tenant= (handle_stt also reads the "tenant" form field, which needs the body).
+    The tenant is a context variable, so offload() carries it into executor threads.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        request = HTTPConnection(scope)
+        try:
+            token = set_request_tenant(requested_tenant(request.headers, request.query_params),
+                                       requested_tenant_key(request.headers, request.query_params))
+        except TenantError as e:
+            if scope["type"] == "websocket":
+                return await send({"type": "websocket.close", "code": 1008, "reason": str(e)})
+            return await JSONResponse({"error": str(e)}, status_code=_tenant_error_status(e))(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_tenant(token)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+
+app = Starlette(routes=routes, lifespan=lifespan, middleware=[Middleware(TenantMiddleware), Middleware(TraceMiddleware), Middleware(ProfileMiddleware)])
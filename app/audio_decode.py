@@ -0,0 +1,96 @@
+"""
+audio_decode.py
+
+In-memory decoding of uploaded audio into 16 kHz mono float32 arrays for Whisper,
+so /stt never has to write the upload to disk. Plain PCM WAV is decoded with the
+standard library; everything else (webm/ogg/mp4 from MediaRecorder) goes through
+PyAV from a memory buffer. A temp-file path remains as a fallback for codecs that
+can't be decoded from memory.
+"""
+
+import io
+import os
+import tempfile
+import wave
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.jarvis_logger import logger
+
+SAMPLE_RATE = 16000
+
+
+def resample(samples, from_rate, to_rate=SAMPLE_RATE):
+    """
+    Linear-interpolation resample, preserving dtype. Good enough for speech recognition.
+    """
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    target_len = int(round(len(samples) * to_rate / from_rate))
+    positions = np.linspace(0, len(samples) - 1, target_len)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(samples.dtype)
+
+
+def _decode_wav(data):
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return resample(samples, rate)
+
+
+def _decode_av(data):
+    # faster-whisper's decoder wraps PyAV and accepts file-like objects
+    from faster_whisper import decode_audio
+    return decode_audio(io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+
+
+def decode_audio_bytes(data):
+    """
+    Decode an uploaded clip to a 16 kHz mono float32 array, or None if it can't be
+    decoded in memory.
+    """
+    if not data:
+        return None
+    try:
+        if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+            return _decode_wav(data)
+        return _decode_av(data)
+    except Exception as e:
+        logger.warning(f"[STT] → In-memory decode failed ({e}), falling back to temp file")
+        return None
+
+
+@contextmanager
+def decoded_audio(data, suffix=".wav"):
+    """
+    Yield something Whisper can transcribe: a float32 array when in-memory decoding
+    works, otherwise the path of a temp file holding the raw upload (removed on exit).
+    """
+    audio = decode_audio_bytes(data)
+    if audio is not None:
+        yield audio
+        return
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmpfile:
+        tmpfile.write(data)
+        tmp_path = tmpfile.name
+    try:
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
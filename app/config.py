@@ -19,6 +19,8 @@ ROOM_SYNONYMS = {
 }
 # config.py
 
+import os
+
 ALLOWED_ACTIONS = [
     "add_inventory",
     "update_inventory",
@@ -41,4 +43,143 @@ ALLOWED_ACTIONS = [
 ]
 
 MODEL_NAME = "mistral"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = os.environ.get("JARVIS_OLLAMA_URL", "http://localhost:11434/api/generate")
+
+# Model warmth: how long Ollama keeps the model resident after a request, and
+# how early before that expiry the keep-alive ping is sent.
+LLM_KEEP_ALIVE_SECONDS = 600
+LLM_KEEPALIVE_MARGIN_SECONDS = 60
+LLM_PRELOAD_TIMEOUT_SECONDS = 120
+# Stop refreshing after this many seconds without a real command (None = never stop)
+LLM_KEEP_WARM_IDLE_SECONDS = None
+
+# Overlap STT, memory retrieval and LLM warm-up in /stt (can be overridden per request)
+STT_PIPELINED = True
+# Threads shared by all requests for per-segment retrieval (None = one per STT pool worker);
+# each request still retrieves its own segments in order
+STT_RETRIEVAL_WORKERS = None
+
+# LLM resilience: per-attempt timeout, overall deadline per request, backoff and circuit breaker
+LLM_ATTEMPT_TIMEOUT_SECONDS = 20
+LLM_DEADLINE_SECONDS = 25
+LLM_MAX_ATTEMPTS = 3
+LLM_BACKOFF_BASE_SECONDS = 0.25
+LLM_BACKOFF_MAX_SECONDS = 2.0
+LLM_BREAKER_FAILURE_THRESHOLD = 3
+LLM_BREAKER_RESET_SECONDS = 30
+
+# Streaming STT over WebSocket (/ws/stt): 16 kHz mono int16 PCM from the browser
+STREAM_SAMPLE_RATE = 16000
+STREAM_ALLOWED_SAMPLE_RATES = [8000, 16000, 22050, 24000, 32000, 44100, 48000]
+STREAM_FRAME_MS = 30
+STREAM_END_SILENCE_MS = 700
+STREAM_PARTIAL_INTERVAL_SECONDS = 1.0
+STREAM_COMMIT_MARGIN_SECONDS = 1.0
+STREAM_MAX_UTTERANCE_SECONDS = 15
+STREAM_RECEIVE_TIMEOUT_SECONDS = 10
+STREAM_VAD_AGGRESSIVENESS = 2
+STREAM_ENERGY_THRESHOLD = 0.01
+
+# STT speed profiles. "auto" picks fast for clips up to STT_AUTO_FAST_MAX_SECONDS.
+STT_PROFILES = {
+    "fast": {
+        "model": "base.en",
+        "compute_type": "int8",
+        "beam_size": 1,
+        "best_of": 1,
+        "vad_filter": True,
+        "condition_on_previous_text": False
+    },
+    "accurate": {
+        "model": "small",
+        "compute_type": "int8",
+        "beam_size": 5,
+        "best_of": 5,
+        "vad_filter": False,
+        "condition_on_previous_text": True
+    }
+}
+STT_DEFAULT_PROFILE = "auto"
+STT_AUTO_FAST_MAX_SECONDS = 6.0
+STT_PRELOAD_PROFILES = ["fast", "accurate"]
+# CTranslate2 starts native threads when a model loads and they don't survive fork(),
+# so whisper_stt skips the import-time preload while PREFORK_ENV is set (the pre-fork
+# parent sets it before importing the app) and each worker loads after forking
+STT_PRELOAD_AT_IMPORT = True
+PREFORK_ENV = "JARVIS_PREFORK"
+STREAM_STT_PROFILE = "fast"
+# Share of requests re-transcribed with the other profile in the background to measure agreement
+STT_AGREEMENT_SAMPLE_RATE = 0.1
+STT_TELEMETRY_WINDOW = 1000
+
+# STT worker pool. Workers default to cores // STT_CPU_THREADS_PER_WORKER.
+STT_POOL_WORKERS = None
+STT_CPU_THREADS_PER_WORKER = 2
+STT_QUEUE_MAX = 32
+STT_JOB_TIMEOUT_SECONDS = 30
+
+# Async (ASGI) serving mode: python -m app.run --mode asgi
+ASGI_WORKERS = 1
+ASGI_EXECUTOR_THREADS = 8
+ASGI_GRACEFUL_SHUTDOWN_SECONDS = 15
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5000
+SSL_CERT_PATH = "certs/cert.pem"
+SSL_KEY_PATH = "certs/key.pem"
+
+# Metrics and profiling
+METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+PROFILE_SAMPLE_RATE = 0.0          # share of requests to profile automatically
+PROFILE_INTERVAL_SECONDS = 0.005
+PROFILE_DIR = "logs/profiles"
+EMBED_CACHE_SIZE = 256
+METRICS_SHARE_SECONDS = 5          # pre-fork workers publish metrics to the parent this often
+
+# Logging. Writes go through a queue to a background thread; files rotate on size or daily.
+LOG_FILE = "logs/jarvis.log"
+LOG_DEBUG = os.environ.get("JARVIS_DEBUG", "").lower() in ("1", "true", "yes")
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_SECONDS = 24 * 60 * 60
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_MAX = 10000              # records beyond this are dropped rather than blocking requests
+LOG_PAYLOAD_MAX_CHARS = 500        # prompts/memory blocks are truncated to this unless tracing
+LOG_MESSAGE_MAX_CHARS = 4000       # hard cap for any single log line
+LOG_RING_SIZE = 1000               # recent formatted log lines kept in memory for /logs
+LOG_RECENT_DEFAULT = 50
+
+# Training log (command → LLM response pairs for fine-tuning), see app/training_log.py
+TRAINING_LOG_DIR = "logs/training"
+TRAINING_LOG_FLUSH_BYTES = 64 * 1024
+TRAINING_LOG_FLUSH_SECONDS = 5
+TRAINING_LOG_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+# How app.io_utils.write_json persists data files: "pretty" (indented, in place) or
+# "compact_atomic" (compact JSON via temp file + fsync + rename)
+STORAGE_MODE = "pretty"
+
+# /vectors browsing
+VECTORS_PAGE_SIZE = 50
+VECTORS_MAX_PAGE_SIZE = 1000
+
+# Pre-fork serving mode: python -m app.run --mode prefork --workers N
+PREFORK_WORKERS = 2
+PREFORK_MEMORY_REPORT_DELAY_SECONDS = 30
+PREFORK_MEMORY_REPORT_PATH = "logs/prefork_memory.json"
+
+# Multi-household tenancy. Requests pick a tenant with the X-Jarvis-Tenant header or
+# ?tenant=; without one they use the default tenant, which keeps the original
+# data/ and vector_store/ locations and has no quotas. Other tenants must be listed
+# in TENANT_REGISTRY (python -m app.tenancy add <id>) and send their key.
+TENANT_HEADER = "X-Jarvis-Tenant"
+TENANT_KEY_HEADER = "X-Jarvis-Tenant-Key"
+DEFAULT_TENANT = "default"
+TENANT_ROOT = "tenants"
+TENANT_REGISTRY = "tenants/registry.json"
+TENANT_MAX_OPEN_SHARDS = 16        # vector-store handles kept open; least recently used are closed
+TENANT_QUOTA_ROWS = 5000           # max rows per data file (inventory/shopping/todo)
+TENANT_QUOTA_MEMORY_ENTRIES = 20000
+
+# Vector-store snapshots (python -m app.snapshot export|import), see app/snapshot.py
+SNAPSHOT_DIR = "vector_snapshot"   # per tenant: tenants/<id>/vector_snapshot
+SNAPSHOT_PAGE_SIZE = 500
+SNAPSHOT_SERVE_WHILE_WARMING = True
@@ -1,7 +1,11 @@
 from app.memory_manager import query_memory
 from app.action_handler import execute_action
+from app.metrics import timed
+from app.tenancy import QuotaExceeded
 
 def route_intent(parsed_json: dict) -> str:
+    if not parsed_json:
+        return "❌ Sorry, I couldn't understand that command."
     action = parsed_json.get("action", "")
 
     valid_actions = {
@@ -15,10 +19,14 @@ def route_intent(parsed_json: dict) -> str:
     # Optional: Inject memory context before handling specific actions
     # This can be expanded per action if needed
     if action in {"update_inventory", "remove_inventory"}:
-        memory_context = query_memory(parsed_json.get("item", ""))
+        memory_context = query_memory(str(parsed_json.get("item", "")), "inventory")
         parsed_json["memory_context"] = memory_context
 
     if action in valid_actions:
-        return execute_action(parsed_json)
+        try:
+            with timed("action"):
+                return execute_action(parsed_json)
+        except QuotaExceeded as e:
+            return f"❌ {e}"
     else:
         return f"❌ Unknown or unsupported action: {action}"
@@ -8,70 +8,19 @@ import os
 import json
 import tempfile
 from datetime import datetime
+
+from app.config import STORAGE_MODE
+from app.tenancy import data_path, check_rows_quota, is_default
+
+# Data file paths for each type
 DATA_FILES = {
     "inventory": "data/inventory.json",
     "todo": "data/todo.json",
     "shopping": "data/shopping.json"
 }
 
-def init_data_files():
-    """
-    Ensure all required data files exist, create if missing.
-    """
-    for key, file in DATA_FILES.items():
-        if not os.path.exists(file):
-            with open(file, "w") as f:
-                f.write("[]" if key == "shopping" else "{}")
-
-def read_json(key):
-    """
-    Read JSON data from file for given key.
-    """
-    with open(DATA_FILES[key], "r") as f:
-        return json.load(f)
-
-def write_json(key, data):
-    """
-    Write JSON data to file for given key.
-    """
-    with open(DATA_FILES[key], "w") as f:
-        json.dump(data, f, indent=2)
-
-def current_date_str():
-    """
-    Return current date as DD-MM-YYYY string.
-    """
-    return datetime.now().strftime("%d-%m-%Y")
-
-def load_json(filepath, default=None):
-    """
-    Load JSON from a file. If missing or invalid, return default (empty list or dict).
-    """
-    if default is None:
-        default = [] if filepath.endswith('.json') else {}
-    try:
-        with open(filepath, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return default
-    except json.JSONDecodeError:
-        return default
+STORAGE_MODES = ("pretty", "compact_atomic")
 
-def save_json(filepath, data):
-    """
-    Write JSON data to file atomically using tempfile + os.replace.
-    Compact format, flush and fsync to ensure data is written to disk.
-    """
-    dirpath = os.path.dirname(filepath)
-    with tempfile.NamedTemporaryFile("w", dir=dirpath, delete=False) as tf:
-        json.dump(data, tf, separators=(",", ":"))
-        tf.flush()
-        os.fsync(tf.fileno())
-        tempname = tf.name
-    try:
-        os.replace(tempname, filepath)
-    except Exception as e:
-        raise RuntimeError(f"Failed to write JSON atomically to {filepath}: {e}")
 def init_data_files():
     """
     Ensure all required data files exist, create if missing.
@@ -80,63 +29,34 @@ def init_data_files():
         if not os.path.exists(file):
             with open(file, "w") as f:
                 f.write("[]" if key == "shopping" else "{}")
-def read_json(key):
-    """
-    Read JSON data from file for given key.
-    """
-    with open(DATA_FILES[key], "r") as f:
-        return json.load(f)
-def write_json(key, data):
-    """
-    Write JSON data to file for given key.
-    """
-    with open(DATA_FILES[key], "w") as f:
-        json.dump(data, f, indent=2)
-def current_date_str():
-    """
-    Return current date as DD-MM-YYYY string.
-    """
-    return datetime.now().strftime("%d-%m-%Y")
-
-"""
-io_utils.py
-
-Utility functions for reading/writing JSON data files and date formatting.
-"""
-
-import os
-import json
-import tempfile
-from datetime import datetime
-
-# Data file paths for each type
-DATA_FILES = {
-    "inventory": "data/inventory.json",
-    "todo": "data/todo.json",
-    "shopping": "data/shopping.json"
-}
 
-def init_data_files():
+def data_file(key, create=False):
     """
-    Ensure all required data files exist, create if missing.
+    Path of the data file for given key, in the current tenant's shard.
     """
-    for key, file in DATA_FILES.items():
-        if not os.path.exists(file):
-            with open(file, "w") as f:
-                f.write("[]" if key == "shopping" else "{}")
+    return data_path(key, DATA_FILES[key], create)
 
 def read_json(key):
     """
-    Read JSON data from file for given key.
+    Read JSON data from file for given key. A tenant shard that hasn't been written yet reads as empty.
     """
-    with open(DATA_FILES[key], "r") as f:
+    path = data_file(key)
+    if not is_default() and not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
         return json.load(f)
 
 def write_json(key, data):
     """
     Write JSON data to file for given key.
-    """
-    with open(DATA_FILES[key], "w") as f:
+    "pretty" rewrites the file in place with indentation; "compact_atomic" uses save_json.
+    Raises tenancy.QuotaExceeded if the write would grow the file past the tenant's row quota.
+    """
+    check_rows_quota(key, data, lambda: len(load_json(data_file(key), [])))
+    if STORAGE_MODE == "compact_atomic":
+        save_json(data_file(key, create=True), data)
+        return
+    with open(data_file(key, create=True), "w") as f:
         json.dump(data, f, indent=2)
 
 def current_date_str():
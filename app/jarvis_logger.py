@@ -1,19 +1,185 @@
 # jarvis_logger.py
+#
+# Logging goes through a bounded queue: request threads only enqueue records and a
+# background listener does the file I/O. The file rotates on size or age, whichever
+# comes first. Large payloads (prompts, memory blocks) are truncated unless debug
+# mode (JARVIS_DEBUG=1) or a per-request trace flag is on.
 
-import os
+import atexit
+import contextvars
 import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from app.config import (
+    LOG_FILE,
+    LOG_DEBUG,
+    LOG_MAX_BYTES,
+    LOG_ROTATE_SECONDS,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_MAX,
+    LOG_PAYLOAD_MAX_CHARS,
+    LOG_MESSAGE_MAX_CHARS,
+    LOG_RECENT_DEFAULT
+)
+from app.log_buffer import ring_handler, recent_logs
 
-os.makedirs("logs", exist_ok=True)
+os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
 
-log_file = "logs/jarvis.log"
+log_file = LOG_FILE
+
+_trace = contextvars.ContextVar("jarvis_log_trace", default=False)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that also rolls over once the current file is `interval` seconds old.
+    """
+
+    def __init__(self, filename, max_bytes, interval, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of blocking the caller.
+    """
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class TruncateFilter(logging.Filter):
+    """
+    Cap every message at LOG_MESSAGE_MAX_CHARS unless full payloads are enabled.
+    """
+
+    def filter(self, record):
+        if full_payloads():
+            return True
+        message = record.getMessage()
+        if len(message) > LOG_MESSAGE_MAX_CHARS:
+            record.msg = truncate(message, LOG_MESSAGE_MAX_CHARS)
+            record.args = None
+        return True
+
+
+def full_payloads():
+    """
+    True if large payloads should be logged in full (debug mode or traced request).
+    """
+    return LOG_DEBUG or _trace.get()
+
+
+def set_trace(enabled):
+    """
+    Enable full payload logging for the current request context. Returns a token for reset_trace.
+    """
+    return _trace.set(bool(enabled))
 
-logging.basicConfig(
-    filename=log_file,
-    filemode="a",
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+
+def reset_trace(token):
+    _trace.reset(token)
+
+
+def truncate(text, limit=LOG_PAYLOAD_MAX_CHARS):
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… [{len(text) - limit} more chars]"
+
+
+def log_payload(label, text):
+    """
+    Log a large payload: in full when tracing, otherwise truncated to one line.
+    """
+    if full_payloads():
+        logger.info("========== BEGIN %s ==========\n%s\n========== END %s ==========", label, text, label)
+    else:
+        logger.info("[%s] %s", label, truncate(" ".join(str(text).split())))
+
+
+_file_handler = SizeAndTimeRotatingFileHandler(log_file, LOG_MAX_BYTES, LOG_ROTATE_SECONDS, LOG_BACKUP_COUNT)
+_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+_file_handler.setFormatter(_formatter)
+ring_handler.setFormatter(_formatter)
+
+_queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_MAX))
+_queue_handler.addFilter(TruncateFilter())
+
+_listener = QueueListener(_queue_handler.queue, _file_handler, ring_handler, respect_handler_level=True)
+_listener.start()
+_listener_pid = os.getpid()
+
+
+def stop_logging():
+    """
+    Flush queued records and stop the background writer (safe to call more than once).
+    Only the process that owns the writer stops it; forked children never do.
+    """
+    if os.getpid() == _listener_pid and _listener._thread is not None:
+        _listener.stop()
+
+
+def use_process_queue(ctx):
+    """
+    Swap the in-process queue for a multiprocessing one so child processes forked
+    from here (ctx must be a "fork" context) log through this process's writer.
+    """
+    global _listener
+    stop_logging()
+    process_queue = ctx.Queue(LOG_QUEUE_MAX)
+    _queue_handler.queue = process_queue
+    _listener = QueueListener(process_queue, _file_handler, ring_handler, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+
+_root = logging.getLogger()
+_root.setLevel(logging.DEBUG if LOG_DEBUG else logging.INFO)
+_root.addHandler(_queue_handler)
 
 # Define and export the logger
 logger = logging.getLogger("jarvis")
+
+
+# Set in pre-fork workers, whose records are written (and buffered) by the parent
+_remote_recent_logs = None
+
+
+def use_remote_recent_logs(fetch):
+    """
+    Serve /logs from fetch(since, limit) instead of this process's ring buffer, which
+    nothing feeds once records go to another process's writer.
+    """
+    global _remote_recent_logs
+    _remote_recent_logs = fetch
+    ring_handler.records.clear()
+
+
+def get_recent_logs(since=None, limit=None):
+    """
+    Recent log lines for /logs; see app.log_buffer.recent_logs.
+    """
+    if _remote_recent_logs is not None:
+        return _remote_recent_logs(since, limit)
+    return recent_logs(since, limit or LOG_RECENT_DEFAULT, fallback_path=log_file)
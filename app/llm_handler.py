@@ -5,75 +5,203 @@ Handles communication with local LLM (Ollama) for command parsing and fuzzy quer
 Logs LLM interactions for training/debugging.
 """
 
+import os
 import requests
 import json
 import re
 import logging
-from app.config import MODEL_NAME, OLLAMA_URL
+from app.config import MODEL_NAME, OLLAMA_URL, LLM_KEEP_ALIVE_SECONDS
 from app.memory_manager import query_memory
+from app.model_warmth import mark_warm
+from app.resilience import call_with_retries, call_with_retries_async, CircuitOpenError, DeadlineExceeded
+from app.offline_parser import parse_offline
+from app.metrics import timed, cache_lookup, error
+from app.jarvis_logger import log_payload, full_payloads
 
-def query_llm(user_input):
+NAMESPACES = ["inventory", "shopping", "todo"]
+MEMORY_SLICES_PER_NAMESPACE = 5
+PROMPT_TEMPLATE_PATH = "app/prompt_template.txt"
+
+_template_cache = {"mtime": None, "text": None}
+
+
+def load_prompt_template():
     """
-    Send user command to LLM, parse structured JSON response.
-    Handles cleaning and logging of LLM output.
+    Return the prompt template, re-reading the file only when it has changed on disk.
+    """
+    mtime = os.path.getmtime(PROMPT_TEMPLATE_PATH)
+    cache_lookup("prompt_template", _template_cache["mtime"] == mtime)
+    if _template_cache["mtime"] != mtime:
+        with open(PROMPT_TEMPLATE_PATH, "r") as f:
+            _template_cache["text"] = f.read()
+        _template_cache["mtime"] = mtime
+    return _template_cache["text"]
+
+
+def retrieve_memory(user_input):
+    """
+    Query memory across all namespaces. Returns {namespace: [entries]}.
+    """
+    return {ns: query_memory(user_input, ns) or [] for ns in NAMESPACES}
+
+
+def merge_memory(*slice_maps):
+    """
+    Merge several retrieve_memory() results, keeping first-seen order and dropping duplicates.
+    """
+    merged = {ns: [] for ns in NAMESPACES}
+    for slice_map in slice_maps:
+        for ns, entries in slice_map.items():
+            for entry in entries:
+                if entry not in merged.setdefault(ns, []):
+                    merged[ns].append(entry)
+    return merged
+
+
+def build_memory_context(memory_slices):
+    """
+    Render retrieved memory slices into the <BEGIN MEMORY> block used by the prompt.
     """
-    # Step 1 & 2: Query memory across all namespaces and prepare context
-    namespaces = ["inventory", "shopping", "todo"]
     memory_contexts = []
-    for ns in namespaces:
-        slices = query_memory(user_input, ns)
+    for ns, slices in memory_slices.items():
         if slices:
-            # Limit to top 5 entries and sanitize newlines
-            sanitized = [entry.replace("\n", " ") for entry in slices[:5]]
+            # Limit to top entries and sanitize newlines
+            sanitized = [entry.replace("\n", " ") for entry in slices[:MEMORY_SLICES_PER_NAMESPACE]]
             block = f"<memory namespace=\"{ns}\">\n" + "\n".join(sanitized) + "\n</memory>"
             memory_contexts.append(block)
     if memory_contexts:
         memory_context = "<BEGIN MEMORY>\n" + "\n\n".join(memory_contexts) + "\n<END MEMORY>"
-        logging.info("[RAG] Injected Memory Context:\n%s", memory_context)
     else:
         memory_context = "<BEGIN MEMORY>\n(No previous entries found)\n<END MEMORY>"
+    return memory_context
 
-    # Log memory context for LLM specifically
-    logging.info("========== BEGIN INJECTED MEMORY ==========\n%s\n========== END INJECTED MEMORY ==========", memory_context.strip())
 
-    # Step 3: Inject memory into the prompt
+def offline_fallback(user_input):
+    """
+    Deterministic answer used while the LLM is unavailable.
+    """
+    structured = parse_offline(user_input)
+    if structured:
+        logging.info("[LLM] Offline parser handled command: %s", structured)
+    else:
+        logging.warning("[LLM] Offline parser could not handle command: %s", user_input)
+    return structured
+
+
+def build_payload(user_input, memory_slices):
+    """
+    Inject memory into the prompt template and return the Ollama request body, or None
+    if the template can't be loaded.
+    """
+    with timed("prompt_build"):
+        return _build_payload(user_input, memory_slices)
+
+
+def _build_payload(user_input, memory_slices):
+    memory_context = build_memory_context(memory_slices)
+
+    # Full memory/prompt only in debug mode or for traced requests; truncated otherwise
+    log_payload("INJECTED MEMORY", memory_context.strip())
+
     try:
-        with open("app/prompt_template.txt", "r") as f:
-            template = f.read()
+        template = load_prompt_template()
         prompt = template.replace("{memory_context}", memory_context).replace("{user_input}", user_input)
-        logging.info("========== BEGIN FINAL PROMPT ==========\n%s\n========== END FINAL PROMPT ==========", prompt)
+        log_payload("FINAL PROMPT", prompt)
     except Exception as e:
         logging.error("Failed to load prompt template: %s", e)
+        error("prompt_build")
         return None
 
-    payload = {
+    return {
         "model": MODEL_NAME,
         "prompt": prompt,
         "stream": False,
-        "format": "json"
+        "format": "json",
+        "keep_alive": LLM_KEEP_ALIVE_SECONDS
     }
 
+
+def parse_response(data, user_input):
+    """
+    Extract the structured command from an Ollama /api/generate response body.
+    """
+    mark_warm()
+    parsed = data.get("response", None)
+
+    if not parsed:
+        logging.error("LLM returned empty response.")
+        return None
+
     try:
-        res = requests.post(OLLAMA_URL, json=payload)
+        structured = json.loads(parsed)
+    except json.JSONDecodeError as e:
+        logging.error("Failed to parse JSON from LLM response: %s", e)
+        error("llm_parse")
+        logging.debug("Response content: %s", parsed)
+        return None
+
+    logging.info("User Command: %s", user_input)
+    logging.info("LLM Parsed: %s", json.dumps(structured, indent=2 if full_payloads() else None))
+
+    return structured
+
+
+def query_llm(user_input, memory_slices=None):
+    """
+    Send user command to LLM, parse structured JSON response.
+    Handles cleaning and logging of LLM output.
+    Pass memory_slices to reuse retrieval that already ran (e.g. overlapped with STT).
+    """
+    # Step 1 & 2: Query memory across all namespaces and prepare context
+    if memory_slices is None:
+        memory_slices = retrieve_memory(user_input)
 
-        data = res.json()
-        parsed = data.get("response", None)
+    # Step 3: Inject memory into the prompt
+    payload = build_payload(user_input, memory_slices)
+    if payload is None:
+        return None
 
-        if not parsed:
-            logging.error("LLM returned empty response.")
-            return None
+    def _post(timeout):
+        res = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
+        res.raise_for_status()
+        return res.json()
 
+    try:
         try:
-            structured = json.loads(parsed)
-        except json.JSONDecodeError as e:
-            logging.error("Failed to parse JSON from LLM response: %s", e)
-            logging.debug("Response content: %s", parsed)
-            return None
+            with timed("llm_call"):
+                data = call_with_retries(_post)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logging.warning("[LLM] Unavailable (%s), falling back to offline parser", e)
+            return offline_fallback(user_input)
+        return parse_response(data, user_input)
+
+    except Exception as e:
+        logging.error("LLM error: %s", e)
+        return None
 
-        logging.info("User Command: %s", user_input)
-        logging.info("LLM Parsed: %s", json.dumps(structured, indent=2))
 
-        return structured
+async def query_llm_async(user_input, memory_slices, client):
+    """
+    Async variant of query_llm for the ASGI server. `client` is a shared httpx.AsyncClient;
+    memory retrieval is CPU-bound, so callers run it in an executor and pass the slices in.
+    """
+    payload = build_payload(user_input, memory_slices)
+    if payload is None:
+        return None
+
+    async def _post(timeout):
+        res = await client.post(OLLAMA_URL, json=payload, timeout=timeout)
+        res.raise_for_status()
+        return res.json()
+
+    try:
+        try:
+            with timed("llm_call"):
+                data = await call_with_retries_async(_post)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logging.warning("[LLM] Unavailable (%s), falling back to offline parser", e)
+            return offline_fallback(user_input)
+        return parse_response(data, user_input)
 
     except Exception as e:
         logging.error("LLM error: %s", e)
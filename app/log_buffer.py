@@ -0,0 +1,90 @@
+"""
+log_buffer.py
+
+Recent log lines for the /logs endpoint. A logging handler appends formatted records
+to a fixed-size ring buffer, each tagged with an increasing sequence number so
+clients can poll with ?since=<seq> and only receive what's new. Right after startup
+the buffer is empty, so the tail of the log file is read from the end instead.
+"""
+
+import os
+import threading
+import logging
+from collections import deque
+
+from app.config import LOG_RING_SIZE, LOG_RECENT_DEFAULT
+
+_TAIL_BLOCK = 8192
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=LOG_RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self.seq = 0
+        self._buffer_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._buffer_lock:
+            self.seq += 1
+            self.records.append((self.seq, line))
+
+    def since(self, seq=None, limit=LOG_RECENT_DEFAULT):
+        """
+        Return (entries, next_seq, missed): lines after `seq` (or the last `limit` lines),
+        the sequence to poll from next, and how many lines after `seq` already fell out of the buffer.
+        """
+        with self._buffer_lock:
+            records = list(self.records)
+            next_seq = self.seq
+        missed = 0
+        if seq is not None:
+            if records and records[0][0] > seq + 1:
+                missed = records[0][0] - seq - 1
+            records = [r for r in records if r[0] > seq]
+            records = records[:limit]
+            if records:
+                next_seq = records[-1][0]
+        else:
+            records = records[-limit:]
+        return [{"seq": s, "line": line} for s, line in records], next_seq, missed
+
+
+def tail_file(path, line_count=LOG_RECENT_DEFAULT):
+    """
+    Return the last `line_count` lines of a file, reading backwards in blocks
+    so the cost doesn't grow with the file size.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= line_count:
+                step = min(_TAIL_BLOCK, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    return lines[-line_count:]
+
+
+ring_handler = RingBufferHandler()
+
+
+def recent_logs(since=None, limit=LOG_RECENT_DEFAULT, fallback_path=None):
+    """
+    Response body for /logs. Without `since`, falls back to the log file tail while
+    the ring buffer is still empty (those lines carry no sequence number).
+    """
+    entries, next_seq, missed = ring_handler.since(since, limit)
+    if since is None and not entries and fallback_path:
+        entries = [{"seq": None, "line": line} for line in tail_file(fallback_path, limit)]
+    return {"entries": entries, "next": next_seq, "missed": missed}
@@ -6,14 +6,18 @@ JSON_PATHS = {
     "shopping": "data/shopping.json",
     "todo": "data/todo.json"
 }
-import chromadb
-from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict
+from collections import OrderedDict
+import threading
+from app.config import EMBED_CACHE_SIZE
+from app.metrics import timed, cache_lookup
+from app.vector_store import CollectionHandle, DB_DIR, COLLECTION_NAME
+from app.tenancy import current_tenant, data_path, memory_quota_reached
+from app.jarvis_logger import logger
+from app.snapshot import query_index, embedding_for
 
 # --- Setup ---
-DB_DIR = "vector_store"
-COLLECTION_NAME = "jarvis_memory"
 EMBED_MODEL = "nomic-embed-text-v1"
 
 embedding_model = SentenceTransformer(EMBED_MODEL, trust_remote_code=True)
@@ -24,19 +28,31 @@ def get_deterministic_id(data: Dict):
     canonical_string = json.dumps(data, sort_keys=True).encode('utf-8')
     return hashlib.md5(canonical_string).hexdigest()
 
-client = chromadb.Client(Settings(chroma_db_impl="duckdb+parquet", persist_directory=DB_DIR))
-collection = client.get_or_create_collection(COLLECTION_NAME)
+# Opened on first use (or reached over RPC in pre-fork mode), see app/vector_store.py
+collection = CollectionHandle()
 
 
 # --- Memory Add ---
-def add_to_memory(namespace: str, data: Dict):
+def memory_id(namespace: str, data: Dict) -> str:
+    return f"{namespace}-{get_deterministic_id(data)}"
+
+
+def add_to_memory(namespace: str, data: Dict, embedding=None):
     """
     Store a record in memory (vector DB) under a namespace like 'inventory' or 'todo'.
+    Pass `embedding` to reuse a known vector instead of running the embedding model.
     """
+    if memory_quota_reached(collection.count):
+        # The JSON file stays the source of truth; only recall for this entry is lost
+        logger.warning(f"[MEMORY] → Memory quota reached for '{current_tenant()}', not indexing {namespace} entry")
+        return
+
     doc_text = f"search_document: {namespace} entry: {str(data)}".strip().lower()
-    embedding = embedding_model.encode([doc_text], convert_to_tensor=False)[0]
+    if embedding is None:
+        with timed("embedding"):
+            embedding = embedding_model.encode([doc_text], convert_to_tensor=False)[0]
 
-    doc_id = f"{namespace}-{get_deterministic_id(data)}"
+    doc_id = memory_id(namespace, data)
 
     collection.upsert(
         documents=[doc_text],
@@ -46,19 +62,49 @@ def add_to_memory(namespace: str, data: Dict):
     )
 
 
+# --- Query Embedding Cache ---
+# The same command text is embedded once per namespace and often repeated verbatim
+_embed_cache = OrderedDict()
+_embed_cache_lock = threading.Lock()
+
+
+def embed_query(user_input: str):
+    """
+    Embed a search query, reusing recent results from a small LRU cache.
+    """
+    text = f"search_query: {user_input}"
+    with _embed_cache_lock:
+        cached = _embed_cache.get(text)
+        if cached is not None:
+            _embed_cache.move_to_end(text)
+    cache_lookup("query_embedding", cached is not None)
+    if cached is not None:
+        return cached
+
+    with timed("embedding"):
+        embedding = embedding_model.encode([text], convert_to_tensor=False)[0]
+    with _embed_cache_lock:
+        _embed_cache[text] = embedding
+        if len(_embed_cache) > EMBED_CACHE_SIZE:
+            _embed_cache.popitem(last=False)
+    return embedding
+
+
 # --- Memory Query ---
 def query_memory(user_input: str, namespace: str, top_k=3) -> List[Dict]:
     """
     Fetch relevant memory slices from vector DB for the given namespace and user input.
     """
-    user_input_with_prefix = f"search_query: {user_input}"
-    embedding = embedding_model.encode([user_input_with_prefix], convert_to_tensor=False)[0]
+    embedding = embed_query(user_input)
 
-    results = collection.query(
-        query_embeddings=[embedding],
-        n_results=top_k,
-        where={"namespace": namespace}
-    )
+    # Right after startup the snapshot answers while the store warms up
+    index = query_index(collection) or collection
+    with timed("vector_query"):
+        results = index.query(
+            query_embeddings=[embedding],
+            n_results=top_k,
+            where={"namespace": namespace}
+        )
 
     return results.get("documents", [[]])[0]
 
@@ -70,9 +116,11 @@ def sync_memory_with_json(namespace: str):
     """
     Rebuild vector DB for a namespace from the latest JSON file entries.
     """
-    file_path = JSON_PATHS.get(namespace)
-    if not file_path or not os.path.exists(file_path):
-        return  # File not found or invalid namespace
+    if namespace not in JSON_PATHS:
+        return  # Invalid namespace
+    file_path = data_path(namespace, JSON_PATHS[namespace])
+    if not os.path.exists(file_path):
+        return  # File not found
 
     with open(file_path, "r") as f:
         data = json.load(f)
@@ -80,5 +128,10 @@ def sync_memory_with_json(namespace: str):
     # Clear previous entries for this namespace before re-adding
     collection.delete(where={"namespace": namespace})
 
+    # Entries unchanged since the last snapshot reuse its embeddings
+    reused = 0
     for entry in data:
-        add_to_memory(namespace, entry)
\ No newline at end of file
+        cached = embedding_for(memory_id(namespace, entry))
+        reused += cached is not None
+        add_to_memory(namespace, entry, cached)
+    logger.info(f"[MEMORY] → Synced {len(data)} {namespace} entries ({reused} embeddings reused from snapshot)")
\ No newline at end of file
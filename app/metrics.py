@@ -0,0 +1,361 @@
+"""
+metrics.py
+
+In-process instrumentation: per-stage latency histograms (stt, embedding, vector_query,
+prompt_build, llm_call, action), counters for cache hits and errors, callback gauges,
+Prometheus text rendering for /metrics, and an optional sampling profiler that can be
+attached to individual requests.
+"""
+
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as _TallyCounter
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.config import (
+    METRICS_BUCKETS,
+    METRICS_SHARE_SECONDS,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_INTERVAL_SECONDS,
+    PROFILE_DIR
+)
+
+STAGES = ["stt", "embedding", "vector_query", "prompt_build", "llm_call", "action"]
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with _lock:
+            self.total += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+
+_histograms = {stage: Histogram() for stage in STAGES}
+_counters = {}   # (name, labels tuple) -> value
+_counter_help = {
+    "jarvis_cache_requests_total": "Cache lookups by cache and result (hit/miss).",
+    "jarvis_errors_total": "Errors by pipeline stage."
+}
+_gauges = {}     # name -> (help, callback returning number)
+
+
+def observe(stage, seconds):
+    _histograms.setdefault(stage, Histogram()).observe(seconds)
+
+
+def inc(name, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + 1
+
+
+def cache_lookup(cache, hit):
+    inc("jarvis_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def error(stage):
+    inc("jarvis_errors_total", stage=stage)
+
+
+def register_gauge(name, help_text, callback):
+    """
+    Register a gauge whose value is read from callback() at scrape time.
+    """
+    _gauges[name] = (help_text, callback)
+
+
+class _Timer:
+    elapsed = 0.0
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block into the stage histogram; exceptions are counted as stage errors.
+    The yielded object's .elapsed is set on exit so callers can still log/report it.
+    """
+    timer = _Timer()
+    start = time.perf_counter()
+    try:
+        yield timer
+    except Exception:
+        error(stage)
+        raise
+    finally:
+        timer.elapsed = time.perf_counter() - start
+        observe(stage, timer.elapsed)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _fmt(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def snapshot():
+    """
+    Plain-data copy of every metric, with gauges read now. Picklable, so pre-fork
+    workers can ship it to the parent (see share_metrics).
+    """
+    with _lock:
+        histograms = {k: (list(h.buckets), list(h.counts), h.total, h.sum) for k, h in _histograms.items()}
+        counters = dict(_counters)
+    gauges = {}
+    for name, (help_text, callback) in sorted(_gauges.items()):
+        try:
+            gauges[name] = (help_text, callback())
+        except Exception:
+            continue
+    return {"histograms": histograms, "counters": counters, "gauges": gauges}
+
+
+def _render(snapshots):
+    """
+    Prometheus text for [(extra label pairs, snapshot)], one metric family at a time.
+    """
+    lines = [
+        "# HELP jarvis_stage_duration_seconds Latency of each pipeline stage.",
+        "# TYPE jarvis_stage_duration_seconds histogram"
+    ]
+    for extra, snap in snapshots:
+        for stage, (buckets, counts, total, total_sum) in snap["histograms"].items():
+            labels = (("stage", stage),) + extra
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                lines.append(f"jarvis_stage_duration_seconds_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"jarvis_stage_duration_seconds_bucket{_labels(labels + (('le', '+Inf'),))} {total}")
+            lines.append(f"jarvis_stage_duration_seconds_sum{_labels(labels)} {_fmt(total_sum)}")
+            lines.append(f"jarvis_stage_duration_seconds_count{_labels(labels)} {total}")
+
+    for name in sorted({name for _, snap in snapshots for name, _ in snap["counters"]}):
+        lines.append(f"# HELP {name} {_counter_help.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for extra, snap in snapshots:
+            for (counter_name, labels), value in sorted(snap["counters"].items()):
+                if counter_name == name:
+                    lines.append(f"{name}{_labels(tuple(labels) + extra)} {value}")
+
+    gauge_help = {name: help_text for _, snap in snapshots for name, (help_text, _) in snap["gauges"].items()}
+    for name in sorted(gauge_help):
+        lines.append(f"# HELP {name} {gauge_help[name]}")
+        lines.append(f"# TYPE {name} gauge")
+        for extra, snap in snapshots:
+            if name in snap["gauges"]:
+                lines.append(f"{name}{_labels(extra)} {_fmt(snap['gauges'][name][1])}")
+
+    return "\n".join(lines) + "\n"
+
+
+# Set in pre-fork workers: (worker label, publish(label, snapshot), collect() -> {label: snapshot})
+_shared = None
+
+
+def share_metrics(label, publish, collect, interval=METRICS_SHARE_SECONDS):
+    """
+    Pre-fork mode: publish this process's metrics under `label` every `interval`
+    seconds (and on every scrape), so whichever worker answers /metrics can render
+    all of them, each series labelled worker="<label>".
+    """
+    global _shared
+    _shared = (label, publish, collect)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                publish(label, snapshot())
+            except Exception:
+                pass  # the parent is gone or restarting; the next scrape surfaces the error
+
+    threading.Thread(target=loop, name="metrics-share", daemon=True).start()
+
+
+def process_info():
+    """
+    Which process answered, for per-process status endpoints; empty unless pre-forked.
+    """
+    return {} if _shared is None else {"worker": _shared[0], "pid": os.getpid()}
+
+
+def render_prometheus():
+    """
+    Render all metrics in the Prometheus text exposition format. In pre-fork mode
+    this covers every worker, not just the one handling the scrape.
+    """
+    if _shared is None:
+        return _render([((), snapshot())])
+    label, publish, collect = _shared
+    publish(label, snapshot())
+    return _render([((("worker", worker),), snap) for worker, snap in sorted(collect().items())])
+
+
+# ==== SAMPLING PROFILER ====
+
+# Leaf frames of threads parked on a lock or queue rather than running code
+_IDLE_LEAVES = {"threading.py:wait", "threading.py:_wait_for_tstate_lock", "queue.py:get",
+                "selectors.py:select", "base_events.py:_run_once"}
+
+_active_profiler = contextvars.ContextVar("jarvis_profiler", default=None)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread snapshots the stacks of the target
+    threads every `interval` seconds and tallies them in collapsed-stack form
+    ("file:func;file:func count"), which flamegraph tools read directly.
+
+    Request profiles start with just the request's thread; pool and executor threads
+    add themselves (see attributed()) while they run work for that request. With
+    thread_ids=None every thread is sampled, minus threads idling in wait/get frames.
+    """
+
+    def __init__(self, thread_ids=None, interval=PROFILE_INTERVAL_SECONDS):
+        self.thread_ids = _TallyCounter(thread_ids) if thread_ids is not None else None
+        self.interval = interval
+        self.stacks = _TallyCounter()
+        self.samples = 0
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def attach_thread(self, tid):
+        if self.thread_ids is not None:
+            with self._threads_lock:
+                self.thread_ids[tid] += 1
+
+    def detach_thread(self, tid):
+        if self.thread_ids is not None:
+            with self._threads_lock:
+                self.thread_ids[tid] -= 1
+                if self.thread_ids[tid] <= 0:
+                    del self.thread_ids[tid]
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            targets = None
+            if self.thread_ids is not None:
+                with self._threads_lock:
+                    targets = set(self.thread_ids)
+            for tid, frame in sys._current_frames().items():
+                if tid == own or (targets is not None and tid not in targets):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if targets is None and stack[0] in _IDLE_LEAVES:
+                    continue
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self
+
+    def write(self, label):
+        """
+        Write collapsed stacks to PROFILE_DIR and return the file path.
+        """
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "request"
+        path = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{safe_label}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def should_profile(requested=False):
+    """
+    True if this request should be profiled: explicitly requested, or randomly sampled.
+    """
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def set_profiler(profiler):
+    """
+    Make `profiler` the current request's profile. Returns a token for reset_profiler.
+    """
+    return _active_profiler.set(profiler)
+
+
+def reset_profiler(token):
+    _active_profiler.reset(token)
+
+
+def current_profiler():
+    return _active_profiler.get()
+
+
+@contextmanager
+def attributed(profiler=None):
+    """
+    Count the current thread toward `profiler` (default: the context's request
+    profile, if any) for the duration of the block.
+    """
+    profiler = profiler or _active_profiler.get()
+    if profiler is None:
+        yield
+        return
+    tid = threading.get_ident()
+    profiler.attach_thread(tid)
+    try:
+        yield
+    finally:
+        profiler.detach_thread(tid)
+
+
+def run_attributed(fn, *args, **kwargs):
+    with attributed():
+        return fn(*args, **kwargs)
+
+
+@contextmanager
+def profile_block(label, enabled=True):
+    """
+    Profile the enclosed block (the calling thread plus work attributed to it) if
+    enabled; yields the output path holder (a dict).
+    """
+    result = {"path": None}
+    if not enabled:
+        yield result
+        return
+    profiler = SamplingProfiler([threading.get_ident()]).start()
+    token = set_profiler(profiler)
+    try:
+        yield result
+    finally:
+        reset_profiler(token)
+        profiler.stop()
+        result["path"] = profiler.write(label)
@@ -0,0 +1,201 @@
+"""
+model_warmth.py
+
+Keeps the Ollama model resident in memory so a cold load never lands on a user command.
+Tracks the last successful LLM call and sends lightweight keep-alive requests over the
+HTTP API shortly before Ollama's `keep_alive` window expires.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from app.config import (
+    MODEL_NAME,
+    OLLAMA_URL,
+    LLM_KEEP_ALIVE_SECONDS,
+    LLM_KEEPALIVE_MARGIN_SECONDS,
+    LLM_PRELOAD_TIMEOUT_SECONDS,
+    LLM_ATTEMPT_TIMEOUT_SECONDS,
+    LLM_KEEP_WARM_IDLE_SECONDS
+)
+from app.jarvis_logger import logger
+from app.resilience import ollama_breaker
+from app.metrics import register_gauge
+
+_lock = threading.Lock()
+_stop = threading.Event()
+_wake = threading.Event()
+_keepalive_thread = None
+
+_state = {
+    "last_success": None,    # monotonic time of last successful LLM call or ping
+    "last_success_at": None, # wall-clock ISO string, for reporting
+    "last_activity": None,   # monotonic time of last real user command
+    "loading": False,
+    "last_error": None
+}
+
+
+def mark_warm(user_request=True):
+    """
+    Record a successful LLM call. Real user requests also count as activity
+    for the idle cut-off; keep-alive pings do not.
+    """
+    now = time.monotonic()
+    with _lock:
+        _state["last_success"] = now
+        _state["last_success_at"] = datetime.now().isoformat(timespec="seconds")
+        _state["last_error"] = None
+        if user_request:
+            _state["last_activity"] = now
+    _wake.set()
+
+
+def _expires_in():
+    last = _state["last_success"]
+    if last is None:
+        return 0
+    return max(0.0, LLM_KEEP_ALIVE_SECONDS - (time.monotonic() - last))
+
+
+def is_warm():
+    """
+    True if the model is expected to still be resident in Ollama.
+    """
+    with _lock:
+        return _expires_in() > 0
+
+
+register_gauge("jarvis_llm_warm", "1 while the LLM is expected to be resident in Ollama.", lambda: int(is_warm()))
+
+
+def warmth_status():
+    """
+    Return the current warm/cold state for reporting.
+    """
+    with _lock:
+        expires_in = _expires_in()
+        if expires_in > 0:
+            state = "warm"
+        elif _state["loading"]:
+            state = "loading"
+        else:
+            state = "cold"
+        return {
+            "state": state,
+            "model": MODEL_NAME,
+            "last_success_at": _state["last_success_at"],
+            "expires_in": round(expires_in, 1),
+            "keep_alive": LLM_KEEP_ALIVE_SECONDS,
+            "last_error": _state["last_error"],
+            "breaker": ollama_breaker.snapshot()
+        }
+
+
+def ping():
+    """
+    Send a keep-alive request. A generate call with no prompt makes Ollama load the
+    model (if needed) and reset its keep_alive timer without producing any tokens.
+    """
+    payload = {"model": MODEL_NAME, "keep_alive": LLM_KEEP_ALIVE_SECONDS}
+    # While the breaker is open pings are skipped; once half-open, a ping is the recovery probe.
+    # User calls are rejected until the probe returns, so a probe gets an ordinary attempt timeout,
+    # not the long timeout a cold model load needs.
+    probing = ollama_breaker.state == "half_open"
+    timeout = LLM_ATTEMPT_TIMEOUT_SECONDS if probing else LLM_PRELOAD_TIMEOUT_SECONDS
+    if not ollama_breaker.allow_request():
+        with _lock:
+            _state["loading"] = False
+        return False
+    with _lock:
+        _state["loading"] = True
+    start = time.time()
+    try:
+        res = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
+        res.raise_for_status()
+        ollama_breaker.record_success()
+        mark_warm(user_request=False)
+        logger.info(f"[LLM] → Keep-alive ping OK in {round(time.time() - start, 2)} sec")
+        return True
+    except Exception as e:
+        # Any failure must be recorded, or a half-open probe slot would never be released
+        ollama_breaker.record_failure()
+        with _lock:
+            _state["last_error"] = str(e)
+        logger.warning(f"[LLM] → Keep-alive ping failed: {e}")
+        return False
+    finally:
+        with _lock:
+            _state["loading"] = False
+
+
+def ensure_warm():
+    """
+    Start a background preload if the model is cold and none is in flight.
+    Returns the state as it was when called ("warm", "loading" or "cold").
+    """
+    with _lock:
+        if _expires_in() > 0:
+            return "warm"
+        if _state["loading"]:
+            return "loading"
+        _state["loading"] = True
+    threading.Thread(target=ping, name="llm-preload", daemon=True).start()
+    return "cold"
+
+
+def _idle_expired():
+    if LLM_KEEP_WARM_IDLE_SECONDS is None:
+        return False
+    last_activity = _state["last_activity"]
+    return last_activity is None or time.monotonic() - last_activity > LLM_KEEP_WARM_IDLE_SECONDS
+
+
+def _keepalive_loop():
+    while not _stop.is_set():
+        with _lock:
+            expires_in = _expires_in()
+            idle = _idle_expired()
+            never_loaded = _state["last_success"] is None
+        if never_loaded and not idle:
+            wait = 0
+        elif idle:
+            # Nothing to keep warm; sleep until the next real request wakes us up
+            wait = None
+        else:
+            wait = max(0.0, expires_in - LLM_KEEPALIVE_MARGIN_SECONDS)
+
+        if wait is None or wait > 0:
+            _wake.wait(wait)
+            _wake.clear()
+            continue
+        if not ping():
+            # Back off instead of hammering an Ollama that is down
+            _stop.wait(LLM_KEEPALIVE_MARGIN_SECONDS)
+
+
+def start_keepalive():
+    """
+    Start the background keep-alive scheduler (idempotent).
+    """
+    global _keepalive_thread
+    with _lock:
+        if _keepalive_thread and _keepalive_thread.is_alive():
+            return
+        _stop.clear()
+        _keepalive_thread = threading.Thread(target=_keepalive_loop, name="llm-keepalive", daemon=True)
+        _keepalive_thread.start()
+    logger.info(f"[LLM] → Keep-alive scheduler started (keep_alive={LLM_KEEP_ALIVE_SECONDS}s)")
+
+
+def stop_keepalive(timeout=None):
+    """
+    Stop the background keep-alive scheduler, waiting up to `timeout` seconds for it to exit.
+    """
+    _stop.set()
+    _wake.set()
+    if timeout and _keepalive_thread:
+        _keepalive_thread.join(timeout)
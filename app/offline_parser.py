@@ -0,0 +1,151 @@
+"""
+offline_parser.py
+
+Deterministic fallback parser used when the LLM is unavailable (circuit open or
+deadline exceeded). Recognises the common household command shapes and returns
+the same JSON structure the LLM would, or None if the command isn't understood.
+"""
+
+import re
+
+from app.config import ALLOWED_ROOMS, ROOM_SYNONYMS
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+
+_DOMAIN_WORDS = {
+    "shopping": r"(?:shopping(?: list)?|grocery(?: list)?|groceries)",
+    "todo": r"(?:to-?do(?:s| list)?|tasks?)",
+    "inventory": r"(?:inventory|stuff|items)"
+}
+
+
+def _clean(text):
+    text = text.lower().strip()
+    text = re.sub(r"^(?:hey |ok |okay )?jarvis[, ]*", "", text)
+    text = re.sub(r"^(?:please |can you |could you )+", "", text)
+    return re.sub(r"[.!?]+$", "", text).strip()
+
+
+def _split_items(phrase):
+    """
+    "fevicol and phone stand" → ["fevicol", "phone stand"]; single items stay strings.
+    """
+    parts = [p.strip() for p in re.split(r",\s*|\s+and\s+", phrase) if p.strip()]
+    parts = [re.sub(r"^(?:the|my|some)\s+", "", p) for p in parts]
+    return parts[0] if len(parts) == 1 else parts
+
+
+def _quantity(phrase):
+    """
+    Strip a leading count ("2 bottles", "two bottles") and return (quantity, rest).
+    """
+    match = re.match(r"^(\d+|" + "|".join(_NUMBER_WORDS) + r")\s+(.*)$", phrase)
+    if not match:
+        return None, phrase
+    count = match.group(1)
+    return (int(count) if count.isdigit() else _NUMBER_WORDS[count]), match.group(2)
+
+
+def _room_and_location(phrase):
+    """
+    Pull a canonical room out of a location phrase: "bedroom fan shelf" → ("bedroom", "fan shelf").
+    """
+    phrase = re.sub(r"^(?:the|my)\s+", "", phrase.strip())
+    candidates = [(syn, room) for syn, room in ROOM_SYNONYMS.items()]
+    candidates += [(room, room) for room in ALLOWED_ROOMS]
+    # Longest names first so "2nd bedroom" wins over "bedroom"
+    for name, room in sorted(candidates, key=lambda c: -len(c[0])):
+        match = re.search(r"\b" + re.escape(name) + r"\b", phrase)
+        if match:
+            location = (phrase[:match.start()] + phrase[match.end():])
+            location = re.sub(r"(?:^|\s+)(?:in|on|of|at)(?:\s+the)?$", "", location.strip())
+            location = re.sub(r"^(?:in|on|of|at)\s+(?:the\s+)?", "", location)
+            return room, re.sub(r"\s+", " ", location).strip()
+    return "", phrase
+
+
+def _item_fields(item_phrase):
+    quantity, item_phrase = _quantity(item_phrase.strip())
+    fields = {"item": _split_items(item_phrase)}
+    if quantity is not None:
+        fields["quantity"] = quantity
+    return fields
+
+
+def parse_offline(user_input):
+    """
+    Parse a command without the LLM. Returns a dict with an "action" key, or None.
+    """
+    if not user_input:
+        return None
+    text = _clean(user_input)
+    shopping, todo, inventory = _DOMAIN_WORDS["shopping"], _DOMAIN_WORDS["todo"], _DOMAIN_WORDS["inventory"]
+
+    # remove the last entry
+    match = re.search(r"\b(?:remove|delete|undo)\b.*\blast\b", text)
+    if match:
+        if re.search(shopping, text):
+            return {"action": "remove_last_shopping"}
+        if re.search(todo, text):
+            return {"action": "remove_last_todo"}
+        return {"action": "remove_last_inventory"}
+
+    # queries
+    if re.match(r"^(?:show|list|read|what(?:'s| is| are)?(?: on| in)?)\b", text):
+        if re.search(shopping, text):
+            return {"action": "query_shopping"}
+        if re.search(todo, text):
+            return {"action": "query_todo"}
+        if re.search(inventory, text):
+            return {"action": "query_inventory"}
+
+    # shopping
+    match = re.match(r"^(?:add|put)\s+(.+?)\s+(?:to|on|in)\s+(?:the\s+|my\s+)?" + shopping + "$", text) \
+        or re.match(r"^(?:i need to |we need to )?buy\s+(.+)$", text)
+    if match:
+        return {"action": "add_shopping", **_item_fields(match.group(1))}
+    match = re.match(r"^(?:remove|delete)\s+(.+?)\s+from\s+(?:the\s+|my\s+)?" + shopping + "$", text)
+    if match:
+        return {"action": "remove_shopping", "item": _split_items(match.group(1))}
+
+    # todo
+    match = re.match(r"^remind me to\s+(.+)$", text) \
+        or re.match(r"^add\s+(.+?)\s+to\s+(?:the\s+|my\s+)?" + todo + "$", text)
+    if match:
+        return {"action": "add_todo", "task": match.group(1).strip()}
+    match = re.match(r"^(?:remove|delete)\s+(.+?)\s+from\s+(?:the\s+|my\s+)?" + todo + "$", text)
+    if match:
+        return {"action": "remove_todo", "task": match.group(1).strip()}
+
+    # Open questions need the LLM; never turn them into writes
+    if re.match(r"^(?:what|where|which|who|how|when|why|do|does|did|is|are|can)\b", text):
+        return None
+
+    # inventory
+    match = re.match(r"^(?:remove|delete)\s+(.+?)(?:\s+from\s+(?:the\s+|my\s+)?" + inventory + ")?$", text)
+    if match:
+        return {"action": "remove_inventory", "item": _split_items(match.group(1))}
+    match = re.match(r"^move\s+(?:the\s+)?(.+?)\s+(?:from\s+.+?\s+)?to\s+(.+)$", text)
+    if match:
+        room, location = _room_and_location(match.group(2))
+        parsed = {"action": "update_inventory", **_item_fields(match.group(1))}
+        if location:
+            parsed["location"] = location
+        if room:
+            parsed["room"] = room
+        return parsed
+    match = re.match(r"^(?:add|put|keep|store|place)\s+(.+?)\s+(?:in|on|to|into|inside|under)\s+(.+)$", text) \
+        or re.match(r"^(?:the\s+)?(.+?)\s+(?:is|are)\s+(?:kept\s+)?(?:in|on|inside|under)\s+(.+)$", text)
+    if match:
+        room, location = _room_and_location(match.group(2))
+        parsed = {"action": "add_inventory", **_item_fields(match.group(1))}
+        if location:
+            parsed["location"] = location
+        if room:
+            parsed["room"] = room
+        return parsed
+
+    return None
@@ -0,0 +1,262 @@
+"""
+prefork.py
+
+Pre-fork serving mode. The parent imports app.server once (nomic-embed weights,
+prompt template, every module), freezes the GC so those objects stay on shared
+pages, then forks N workers that serve the Flask app on one shared listening socket.
+Workers share the parent's memory copy-on-write instead of each loading their own.
+
+- Chroma is opened by a single owner process; workers reach it through a local
+  RPC (see app/vector_store.py).
+- Whisper models are loaded per worker after the fork: CTranslate2 starts native
+  worker threads at load time and those don't survive fork(). Each worker gets an
+  equal share of the STT pool so the total CPU budget is unchanged.
+- Worker logs go through the parent's log writer over a multiprocessing queue.
+  The parent also runs a small RPC hub: workers answer /logs from the parent's
+  live ring buffer and publish their metrics there, so /metrics on any worker
+  shows every worker (labelled worker="<n>"). /stt-pool and /model-status stay
+  per process and say which worker answered.
+- A per-process memory report (from /proc/<pid>/smaps_rollup) is written to
+  PREFORK_MEMORY_REPORT_PATH after startup and on SIGUSR1.
+
+Run with: python -m app.run --mode prefork --workers N
+"""
+
+import gc
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from app.config import (
+    PREFORK_ENV,
+    PREFORK_WORKERS,
+    PREFORK_MEMORY_REPORT_DELAY_SECONDS,
+    PREFORK_MEMORY_REPORT_PATH,
+    SSL_CERT_PATH,
+    SSL_KEY_PATH
+)
+
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_smaps_rollup(pid):
+    """
+    Return {field: kB} from /proc/<pid>/smaps_rollup, or None if unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in _SMAPS_FIELDS:
+            values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def memory_report(parent_pid, worker_pids, owner_pid=None):
+    """
+    Per-process memory in MB. "private" is what a process costs on its own (pages
+    nobody else maps); "pss" splits shared pages between the processes using them,
+    so the pss total is the real footprint of the whole group.
+    """
+    def describe(role, pid):
+        smaps = read_smaps_rollup(pid)
+        if smaps is None:
+            return {"role": role, "pid": pid, "error": "smaps_rollup unavailable"}
+        return {
+            "role": role,
+            "pid": pid,
+            "rss_mb": round(smaps.get("Rss", 0) / 1024, 1),
+            "pss_mb": round(smaps.get("Pss", 0) / 1024, 1),
+            "shared_mb": round((smaps.get("Shared_Clean", 0) + smaps.get("Shared_Dirty", 0)) / 1024, 1),
+            "private_mb": round((smaps.get("Private_Clean", 0) + smaps.get("Private_Dirty", 0)) / 1024, 1)
+        }
+
+    processes = [describe("parent", parent_pid)]
+    if owner_pid:
+        processes.append(describe("chroma_owner", owner_pid))
+    processes += [describe(f"worker-{i}", pid) for i, pid in enumerate(worker_pids)]
+
+    measured = [p for p in processes if "error" not in p]
+    workers = [p for p in measured if p["role"].startswith("worker")]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "processes": processes,
+        "total_pss_mb": round(sum(p["pss_mb"] for p in measured), 1),
+        "total_rss_mb": round(sum(p["rss_mb"] for p in measured), 1),
+        "worker_private_avg_mb": round(sum(p["private_mb"] for p in workers) / len(workers), 1) if workers else None
+    }
+
+
+class _Hub:
+    """
+    Parent-side state workers reach over RPC: the /logs ring buffer (only the parent's
+    log writer feeds it) and each worker's latest metrics snapshot.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def recent_logs(self, since=None, limit=None):
+        from app.jarvis_logger import get_recent_logs
+        return get_recent_logs(since, limit)
+
+    def publish_metrics(self, worker, snapshot):
+        with self._lock:
+            self._metrics[worker] = snapshot
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+
+_hub = _Hub()
+
+
+class HubManager(BaseManager):
+    pass
+
+
+HubManager.register("hub", callable=lambda: _hub, exposed=("recent_logs", "publish_metrics", "metrics"))
+
+
+def _start_hub(address, authkey):
+    # Served from a thread of the parent itself, so it sees the live ring buffer
+    server = HubManager(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, name="prefork-hub", daemon=True).start()
+
+
+def _connect_hub(address, authkey):
+    manager = HubManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.hub()
+
+
+def _serve_worker(index, listen_socket, stt_workers, hub_address, authkey):
+    from werkzeug.serving import make_server
+    from app import stt_pool, whisper_stt
+    from app.jarvis_logger import logger, use_remote_recent_logs
+    from app.metrics import share_metrics
+    from app.model_warmth import start_keepalive
+    from app.server import app
+
+    hub = _connect_hub(hub_address, authkey)
+    use_remote_recent_logs(hub.recent_logs)
+    share_metrics(str(index), hub.publish_metrics, hub.metrics)
+
+    # Models inherited from the parent would be missing their CTranslate2 threads and hang
+    inherited = whisper_stt.loaded_models()
+    if inherited:
+        raise RuntimeError(f"Whisper models were loaded before fork: {inherited}")
+    stt_pool.STT_POOL_WORKERS = stt_workers
+    whisper_stt.preload_models()
+    start_keepalive()
+
+    ssl_context = None
+    if os.path.exists(SSL_CERT_PATH) and os.path.exists(SSL_KEY_PATH):
+        ssl_context = (SSL_CERT_PATH, SSL_KEY_PATH)
+    host, port = listen_socket.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, ssl_context=ssl_context, fd=listen_socket.fileno())
+
+    def _stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it can't run on the serving thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f"[PREFORK] → Worker {index} (pid {os.getpid()}) serving on {host}:{port}")
+    server.serve_forever()
+    logger.info(f"[PREFORK] → Worker {index} (pid {os.getpid()}) stopped")
+
+
+def run_prefork(host, port, workers=PREFORK_WORKERS):
+    ctx = multiprocessing.get_context("fork")
+    # Must be set before app.server (and with it app.whisper_stt) is imported
+    os.environ[PREFORK_ENV] = "1"
+
+    from app.jarvis_logger import logger, use_process_queue
+    from app.vector_store import start_owner, OWNER_ADDRESS_ENV, OWNER_AUTHKEY_ENV
+    use_process_queue(ctx)
+
+    # Owner first, while this process is still small: it only needs Chroma
+    authkey = secrets.token_bytes(16)
+    socket_dir = tempfile.mkdtemp(prefix="jarvis-prefork-")
+    address = os.path.join(socket_dir, "owner.sock")
+    owner = start_owner(address, authkey, ctx)
+    os.environ[OWNER_ADDRESS_ENV] = address
+    os.environ[OWNER_AUTHKEY_ENV] = authkey.hex()
+
+    load_start = time.time()
+    import app.server  # noqa: F401  loads the embedding model and every module once
+    from app.model_warmth import stop_keepalive
+    from app.stt_pool import pool_size
+    # Threads don't survive fork(); workers start their own keep-alive
+    stop_keepalive(timeout=5)
+    logger.info(f"[PREFORK] → Parent {os.getpid()} preloaded app in {round(time.time() - load_start, 2)} sec")
+
+    listen_socket = socket.create_server((host, port), backlog=128)
+    hub_address = os.path.join(socket_dir, "hub.sock")
+    _start_hub(hub_address, authkey)
+    stt_workers = max(1, pool_size()[0] // workers)
+
+    # Keep preloaded objects out of future collections so the GC doesn't write to (and copy) shared pages
+    gc.collect()
+    gc.freeze()
+
+    def spawn(index):
+        process = ctx.Process(target=_serve_worker, args=(index, listen_socket, stt_workers, hub_address, authkey),
+                              name=f"jarvis-worker-{index}", daemon=False)
+        process.start()
+        return process
+
+    processes = [spawn(i) for i in range(workers)]
+    stopping = threading.Event()
+
+    def write_report():
+        report = memory_report(os.getpid(), [p.pid for p in processes], owner._process.pid)
+        os.makedirs(os.path.dirname(PREFORK_MEMORY_REPORT_PATH) or ".", exist_ok=True)
+        with open(PREFORK_MEMORY_REPORT_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"[PREFORK] → Memory: total PSS {report['total_pss_mb']} MB vs RSS sum {report['total_rss_mb']} MB, "
+                    f"avg private per worker {report['worker_private_avg_mb']} MB ({PREFORK_MEMORY_REPORT_PATH})")
+
+    def delayed_report():
+        if not stopping.wait(PREFORK_MEMORY_REPORT_DELAY_SECONDS):
+            write_report()
+
+    def handle_stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=write_report, daemon=True).start())
+    threading.Thread(target=delayed_report, name="prefork-report", daemon=True).start()
+    logger.info(f"========== SERVER STARTED (prefork, {workers} workers on {host}:{port}) ==========")
+
+    try:
+        while not stopping.is_set():
+            for i, process in enumerate(processes):
+                if not process.is_alive() and not stopping.is_set():
+                    logger.warning(f"[PREFORK] → Worker {i} (pid {process.pid}) exited with {process.exitcode}, restarting")
+                    processes[i] = spawn(i)
+            stopping.wait(1)
+    finally:
+        logger.info("[PREFORK] → Shutting down workers")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(15)
+        listen_socket.close()
+        owner.shutdown()
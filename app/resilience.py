@@ -0,0 +1,215 @@
+"""
+resilience.py
+
+Shared fail-fast layer for calls to Ollama: exponential backoff with full jitter,
+an overall deadline per request, and a circuit breaker that short-circuits calls
+while the backend is unhealthy so offline fallbacks can answer immediately.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import requests
+
+from app.config import (
+    LLM_ATTEMPT_TIMEOUT_SECONDS,
+    LLM_DEADLINE_SECONDS,
+    LLM_MAX_ATTEMPTS,
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_SECONDS
+)
+from app.jarvis_logger import logger
+from app.metrics import register_gauge
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when retries run out of time before a call succeeds."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed → open → half-open breaker.
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout` seconds, then lets a single probe through.
+    """
+
+    def __init__(self, name, failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=LLM_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self):
+        """
+        True if a call may go through. In half-open state only one probe is allowed at a time.
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"[BREAKER] → {self.name} recovered, closing circuit")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """
+        Give up a half-open probe without judging the service (e.g. the call was cancelled).
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._state() != "open":
+                    logger.warning(f"[BREAKER] → {self.name} unhealthy after {self._failures} failure(s), opening circuit for {self.reset_timeout}s")
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            state = self._state()
+            retry_in = 0.0
+            if state == "open":
+                retry_in = self.reset_timeout - (time.monotonic() - self._opened_at)
+            return {"name": self.name, "state": state, "consecutive_failures": self._failures,
+                    "retry_in": round(max(0.0, retry_in), 1)}
+
+
+# Single breaker for the local Ollama instance, shared by every caller in the process
+ollama_breaker = CircuitBreaker("ollama")
+register_gauge("jarvis_llm_breaker_open", "1 while the Ollama circuit breaker is rejecting calls.",
+               lambda: int(ollama_breaker.state == "open"))
+
+
+def backoff_delay(attempt, base=LLM_BACKOFF_BASE_SECONDS, cap=LLM_BACKOFF_MAX_SECONDS):
+    """
+    Full-jitter exponential backoff for the given 0-based attempt number.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retries(fn, breaker=ollama_breaker, deadline=LLM_DEADLINE_SECONDS,
+                      attempts=LLM_MAX_ATTEMPTS, attempt_timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+                      retry_on=(requests.exceptions.RequestException,)):
+    """
+    Call fn(timeout=...) with retries, backoff and an overall deadline.
+    Each attempt's timeout is clipped to the time left before the deadline.
+
+    Raises CircuitOpenError without calling fn if the breaker is open, and
+    DeadlineExceeded once attempts or time run out.
+    """
+    give_up_at = time.monotonic() + deadline
+    last_error = None
+
+    for attempt in range(attempts):
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            break
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"{breaker.name} circuit is open")
+
+        try:
+            result = fn(timeout=min(attempt_timeout, remaining))
+        except retry_on as e:
+            breaker.record_failure()
+            last_error = e
+            logger.error(f"[LLM] Request error (attempt {attempt + 1}/{attempts}): {e}")
+        except Exception:
+            # Not retryable (e.g. a malformed response body), but still a failed call
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or interrupted: free the half-open probe slot so later calls aren't rejected forever
+            breaker.release_probe()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        if attempt + 1 < attempts:
+            delay = min(backoff_delay(attempt), max(0.0, give_up_at - time.monotonic()))
+            time.sleep(delay)
+
+    raise DeadlineExceeded(f"{breaker.name} call failed after retries: {last_error}")
+
+
+async def call_with_retries_async(fn, breaker=ollama_breaker, deadline=LLM_DEADLINE_SECONDS,
+                                  attempts=LLM_MAX_ATTEMPTS, attempt_timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+                                  retry_on=None):
+    """
+    Async counterpart of call_with_retries: awaits fn(timeout=...) and sleeps with
+    asyncio so the event loop stays free during backoff. Defaults to retrying on
+    httpx transport and HTTP status errors.
+    """
+    if retry_on is None:
+        import httpx
+        retry_on = (httpx.HTTPError,)
+
+    give_up_at = time.monotonic() + deadline
+    last_error = None
+
+    for attempt in range(attempts):
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            break
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"{breaker.name} circuit is open")
+
+        try:
+            result = await fn(timeout=min(attempt_timeout, remaining))
+        except retry_on as e:
+            breaker.record_failure()
+            last_error = e
+            logger.error(f"[LLM] Request error (attempt {attempt + 1}/{attempts}): {e}")
+        except Exception:
+            # Not retryable (e.g. a malformed response body), but still a failed call
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or interrupted: free the half-open probe slot so later calls aren't rejected forever
+            breaker.release_probe()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        if attempt + 1 < attempts:
+            delay = min(backoff_delay(attempt), max(0.0, give_up_at - time.monotonic()))
+            await asyncio.sleep(delay)
+
+    raise DeadlineExceeded(f"{breaker.name} call failed after retries: {last_error}")
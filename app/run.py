@@ -1,7 +1,61 @@
-from app.server import app
+import argparse
+import os
+
+from app.config import (
+    ASGI_WORKERS,
+    PREFORK_WORKERS,
+    ASGI_GRACEFUL_SHUTDOWN_SECONDS,
+    SERVER_HOST,
+    SERVER_PORT,
+    SSL_CERT_PATH,
+    SSL_KEY_PATH
+)
 from app.jarvis_logger import logger
 
-if __name__ == "__main__":
+
+def run_flask(host, port):
+    from app.server import app
     logger.info("========== SERVER STARTED (via run.py) ==========")
-    context = ('certs/cert.pem', 'certs/key.pem')
-    app.run(host="0.0.0.0", port=5000, ssl_context=context, debug=False)
+    context = (SSL_CERT_PATH, SSL_KEY_PATH)
+    app.run(host=host, port=port, ssl_context=context, debug=False)
+
+
+def run_asgi(host, port, workers):
+    import uvicorn
+    ssl = {}
+    if os.path.exists(SSL_CERT_PATH) and os.path.exists(SSL_KEY_PATH):
+        ssl = {"ssl_certfile": SSL_CERT_PATH, "ssl_keyfile": SSL_KEY_PATH}
+    else:
+        logger.warning("SSL certs not found. Falling back to HTTP.")
+    logger.info(f"Launching ASGI server with {workers} worker(s)")
+    # uvicorn handles SIGINT/SIGTERM: stops accepting, waits for in-flight requests, runs shutdown
+    uvicorn.run(
+        "app.asgi:app",
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_graceful_shutdown=ASGI_GRACEFUL_SHUTDOWN_SECONDS,
+        log_level="warning",
+        **ssl
+    )
+
+
+def run_prefork(host, port, workers):
+    from app.prefork import run_prefork as serve
+    serve(host, port, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the JARVIS server")
+    parser.add_argument("--mode", choices=["flask", "asgi", "prefork"], default="flask")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, help="worker processes (asgi and prefork modes)")
+    args = parser.parse_args()
+
+    if args.mode == "asgi":
+        run_asgi(args.host, args.port, args.workers or ASGI_WORKERS)
+    elif args.mode == "prefork":
+        run_prefork(args.host, args.port, args.workers or PREFORK_WORKERS)
+    else:
+        run_flask(args.host, args.port)
@@ -1,18 +1,101 @@
-from flask import Flask, request, jsonify, send_from_directory
-from app.whisper_stt import transcribe
-from app.jarvis_logger import logger
-from app.llm_handler import query_llm
+from flask import Flask, request, jsonify, send_from_directory, g, Response, stream_with_context
+from app.whisper_stt import transcribe, resolve_profile
+from app import stt_telemetry
+from app.stt_pool import get_pool, STTQueueFull, STTJobTimeout
+from app.jarvis_logger import logger, set_trace, reset_trace, get_recent_logs
+from app.llm_handler import query_llm, retrieve_memory
 from app.intent_router import route_intent
-import tempfile
+from app.model_warmth import ensure_warm, warmth_status, start_keepalive
+from app.stt_pipeline import run_pipelined
+from app.stream_stt import StreamingTranscriber, StreamProtocolError, parse_control
+from app.audio_decode import decoded_audio
+from app.metrics import render_prometheus, process_info, should_profile, SamplingProfiler, set_profiler, reset_profiler
+from app.vector_browse import parse_args, page_body, ndjson_lines, VectorQueryError
+from app import memory_manager
+from app.snapshot import export_tenant_snapshot
+from app.tenancy import (
+    requested_tenant,
+    requested_tenant_key,
+    set_request_tenant,
+    reset_tenant,
+    TenantError,
+    TenantAccessDenied
+)
+from app.config import STT_PIPELINED, STREAM_RECEIVE_TIMEOUT_SECONDS
 import os
+import json
+import threading
 import time
 import logging as flask_logging
-import subprocess
-import psutil
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 flask_logging.getLogger('werkzeug').setLevel(flask_logging.ERROR)
 
 app = Flask(__name__)
+sock = Sock(app) if Sock else None
+start_keepalive()
+
+
+def _profile_requested():
+    # Not "profile": that form field already selects the STT profile
+    return request.headers.get("X-Jarvis-Profile") == "1" or request.args.get("trace_profile") == "1"
+
+
+@app.before_request
+def start_request_trace():
+    # X-Jarvis-Trace: 1 or ?trace=1 logs this request's prompt and memory in full
+    traced = request.headers.get("X-Jarvis-Trace") == "1" or request.args.get("trace") == "1"
+    g.trace_token = set_trace(traced)
+
+
+@app.teardown_request
+def finish_request_trace(exc):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        reset_trace(token)
+
+
+@app.before_request
+def start_request_tenant():
+    form = request.form if request.method == "POST" else None
+    try:
+        g.tenant_token = set_request_tenant(requested_tenant(request.headers, request.args, form),
+                                            requested_tenant_key(request.headers, request.args, form))
+    except TenantAccessDenied as e:
+        return jsonify({"error": str(e)}), 403
+    except TenantError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.teardown_request
+def finish_request_tenant(exc):
+    token = g.pop("tenant_token", None)
+    if token is not None:
+        reset_tenant(token)
+
+
+@app.before_request
+def start_request_profile():
+    if request.path != "/metrics" and should_profile(_profile_requested()):
+        # Starts with this thread; STT pool and retrieval threads attach while they work for this request
+        g.profiler = SamplingProfiler([threading.get_ident()]).start()
+        g.profiler_token = set_profiler(g.profiler)
+
+
+@app.teardown_request
+def finish_request_profile(exc):
+    token = g.pop("profiler_token", None)
+    if token is not None:
+        reset_profiler(token)
+    profiler = g.pop("profiler", None)
+    if profiler:
+        path = profiler.stop().write(request.path)
+        logger.info(f"[PROFILE] → {request.path}: {profiler.samples} samples written to {path}")
+
 
 @app.route("/")
 def index():
@@ -21,20 +104,63 @@ def index():
 
 @app.route("/preload-model", methods=["POST"])
 def preload_model():
-    # Check if 'ollama runner' is already running
-    for proc in psutil.process_iter(attrs=["cmdline"]):
-        try:
-            if proc.info["cmdline"] and "ollama" in proc.info["cmdline"][0] and "runner" in " ".join(proc.info["cmdline"]):
-                logger.info("[LLM] → Ollama runner already active, skipping preload.")
-                return jsonify({"status": "already_running"})
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+    previous = ensure_warm()
+    if previous == "warm":
+        logger.info("[LLM] → Model already warm, skipping preload.")
+    else:
+        logger.info("[LLM] → Triggered model preload in background")
+    return jsonify({**warmth_status(), "status": "already_running" if previous == "warm" else "preload_started"})
+
+
+@app.route("/model-status", methods=["GET"])
+def model_status():
+    return jsonify({**warmth_status(), **process_info()})
+
 
-    # Trigger background preload with minimal prompt
-    preload_cmd = ["ollama", "run", "mistral", "Hi", "--keepalive", "10m"]
-    subprocess.Popen(preload_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    logger.info("[LLM] → Triggered model preload in background")
-    return jsonify({"status": "preload_started"})
+@app.route("/stt-stats", methods=["GET"])
+def stt_statistics():
+    return jsonify(stt_telemetry.stats())
+
+
+@app.route("/stt-pool", methods=["GET"])
+def stt_pool_metrics():
+    return jsonify({**get_pool().metrics(), **process_info()})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/logs", methods=["GET"])
+def recent_logs():
+    since = request.args.get("since", type=int)
+    return jsonify(get_recent_logs(since, request.args.get("limit", type=int)))
+
+
+@app.route("/vectors", methods=["GET"])
+def fetch_vectors():
+    try:
+        options = parse_args(request.args)
+    except VectorQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if options["stream"]:
+            lines = ndjson_lines(memory_manager.collection, options)
+            return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+        return jsonify(page_body(memory_manager.collection, options))
+    except Exception as e:
+        logger.error(f"[VECTOR] Failed to fetch entries: {e}")
+        return jsonify({"error": "Vector fetch failed"}), 500
+
+
+@app.route("/snapshot", methods=["POST"])
+def create_snapshot():
+    try:
+        return jsonify(export_tenant_snapshot(memory_manager.collection))
+    except Exception as e:
+        logger.error(f"[SNAPSHOT] Export failed: {e}")
+        return jsonify({"error": "Snapshot export failed"}), 500
 
 
 @app.route("/stt", methods=["POST"])
@@ -46,31 +172,46 @@ def handle_stt():
         logger.warning("[STT] No audio received in /stt")
         return jsonify({"error": "No audio file"}), 400
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmpfile:
-        request.files['audio'].save(tmpfile.name)
-        tmp_path = tmpfile.name
-
+    audio_bytes = request.files['audio'].read()
     logger.info("[STT] Received audio input")
 
+    pipelined = request.form.get("pipelined", str(STT_PIPELINED)).lower() in ("1", "true", "yes")
+
     stt_start = time.time()
     try:
-        transcription = transcribe(tmp_path)
-    finally:
-        os.remove(tmp_path)
+        with decoded_audio(audio_bytes) as audio:
+            profile = resolve_profile(request.form.get("profile"), audio)
+            if pipelined:
+                transcription, memory_slices, timings = run_pipelined(audio, profile)
+            else:
+                transcription = transcribe(audio, profile)
+                memory_slices = None
+                timings = {"mode": "sequential", "stt_profile": profile, "stt": round(time.time() - stt_start, 3)}
+    except (STTQueueFull, STTJobTimeout) as e:
+        logger.warning(f"[STT] → Rejected: {e}")
+        return jsonify({"error": f"STT busy, try again: {e}"}), 503
     stt_end = time.time()
     logger.info(f"[STT] STT stage complete in {round(stt_end - stt_start, 2)} sec")
 
     # ==== INTENT PARSING ====
     intent_start = time.time()
     logger.info("[INTENT] → Parsing input text via LLM...")
-    parsed = query_llm(transcription)
+    if memory_slices is None:
+        retrieval_start = time.time()
+        memory_slices = retrieve_memory(transcription)
+        timings["retrieval"] = round(time.time() - retrieval_start, 3)
+    llm_start = time.time()
+    parsed = query_llm(transcription, memory_slices=memory_slices)
     intent_end = time.time()
+    timings["llm"] = round(intent_end - llm_start, 3)
 
     logger.info(f"[INTENT] → Parsed JSON: {parsed}")
     logger.info(f"[INTENT] → Stage complete in {round(intent_end - intent_start, 2)} sec")
 
     # ==== ACTION EXECUTION ====
+    action_start = time.time()
     result = route_intent(parsed)
+    timings["action"] = round(time.time() - action_start, 3)
     duration = round(time.time() - overall_start, 2)
     logger.info(f"[ACTION] → Final Message: {result}")
     logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
@@ -79,7 +220,8 @@ def handle_stt():
         "transcription": transcription,
         "parsed": parsed,
         "message": result,
-        "time_taken": duration
+        "time_taken": duration,
+        "timings": timings
     })
 
 @app.route("/command", methods=["POST"])
@@ -93,18 +235,97 @@ def handle_command():
         logger.info(f"[STT] → Transcribed Text: {user_input}")
 
         logger.info("[INTENT] → Sending to LLM...")
-        parsed = query_llm(user_input)
+        timings = {}
+        retrieval_start = time.time()
+        memory_slices = retrieve_memory(user_input)
+        llm_start = time.time()
+        timings["retrieval"] = round(llm_start - retrieval_start, 3)
+        parsed = query_llm(user_input, memory_slices=memory_slices)
+        timings["llm"] = round(time.time() - llm_start, 3)
         logger.info(f"[INTENT] → Parsed Response: {parsed}")
 
         logger.info("[ACTION] → Routing Intent...")
+        action_start = time.time()
         action_result = route_intent(parsed)
+        timings["action"] = round(time.time() - action_start, 3)
 
         logger.info(f"[ACTION] → Final Message: {action_result}")
         duration = round(time.time() - overall_start, 2)
         logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
 
-        return jsonify({"message": action_result})
+        return jsonify({"message": action_result, "timings": timings})
 
     except Exception as e:
         logger.exception("Error in /command:")
         return jsonify({"message": f"❌ Error: {str(e)}"}), 500
+
+
+def handle_stt_stream(ws):
+    """
+    Streaming voice command. The client sends {"event": "start", "sample_rate": n, "profile": name},
+    then binary little-endian int16 mono PCM chunks while the user speaks, and
+    optionally {"event": "end"}. The server replies with "partial" messages, a
+    "transcript" as soon as VAD detects end of speech, then the command "result".
+    """
+    overall_start = time.time()
+    logger.info("========== START JARVIS COMMAND (stream) ==========")
+    ensure_warm()
+    session = StreamingTranscriber()
+
+    while not session.ended:
+        message = ws.receive(timeout=STREAM_RECEIVE_TIMEOUT_SECONDS)
+        if message is None:
+            logger.warning("[STT] → Stream receive timed out")
+            break
+        if isinstance(message, str):
+            try:
+                control = parse_control(message)
+            except StreamProtocolError as e:
+                logger.warning(f"[STT] → Rejected stream control message: {e}")
+                ws.send(json.dumps({"type": "error", "message": str(e)}))
+                continue
+            if control["event"] == "start":
+                session = StreamingTranscriber(control["sample_rate"], control["profile"])
+            elif control["event"] == "end":
+                break
+            continue
+        partial = session.feed(message)
+        if partial:
+            ws.send(json.dumps({"type": "partial", "text": partial}))
+
+    transcription, stt_stats = session.finalize()
+    logger.info(f"[STT] → Result: {transcription}")
+    logger.info(f"[STT] Stream finalized {round(stt_stats['finalize_sec'], 2)} sec after end of speech "
+                f"({stt_stats['partial_decodes']} partial decodes over {stt_stats['audio_sec']} sec of audio)")
+    ws.send(json.dumps({"type": "transcript", "transcription": transcription, "stt": stt_stats}))
+    if not transcription:
+        return
+
+    timings = {"mode": "stream", "stt_finalize": stt_stats["finalize_sec"]}
+    retrieval_start = time.time()
+    memory_slices = retrieve_memory(transcription)
+    llm_start = time.time()
+    timings["retrieval"] = round(llm_start - retrieval_start, 3)
+    parsed = query_llm(transcription, memory_slices=memory_slices)
+    action_start = time.time()
+    timings["llm"] = round(action_start - llm_start, 3)
+    result = route_intent(parsed)
+    timings["action"] = round(time.time() - action_start, 3)
+
+    duration = round(time.time() - overall_start, 2)
+    logger.info(f"[ACTION] → Final Message: {result}")
+    logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
+    ws.send(json.dumps({
+        "type": "result",
+        "transcription": transcription,
+        "parsed": parsed,
+        "message": result,
+        "time_taken": duration,
+        "timings": timings
+    }))
+
+
+if sock:
+    sock.route("/ws/stt")(handle_stt_stream)
+else:
+    logger.warning("[STT] flask-sock not installed; /ws/stt streaming endpoint disabled")
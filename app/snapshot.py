@@ -0,0 +1,344 @@
+"""
+snapshot.py
+
+Compact, fast-loading copy of a vector store:
+
+    embeddings.npy   float32 matrix (rows × dim), opened with np.load(mmap_mode="r")
+    columns.json     {"ids": [...], "documents": [...], "metadatas": [...]}, row-aligned
+    manifest.json    count, dim, source collection; written last, so it marks a complete snapshot
+
+Uses:
+- import_snapshot() rebuilds a Chroma collection from a snapshot without running
+  the embedding model.
+- export_tenant_snapshot() writes the current tenant's snapshot through the server's
+  own collection handle (POST /snapshot), so it includes writes not yet persisted.
+- Right after startup, query_index() lets memory queries run against the
+  memory-mapped matrix while the real store opens and warms up in the background,
+  but only while the snapshot is at least as new as the store: the manifest keeps
+  the store's write stamp from export time (see vector_store.mark_written), and
+  any later write sends queries straight to the store. An empty store is restored
+  from the snapshot unless it has been written since the export.
+- embedding_for() hands cached embeddings to sync_memory_with_json so unchanged
+  entries aren't re-embedded.
+
+Usage (offline stores only; for a running server use POST /snapshot):
+    python -m app.snapshot export --db-dir DIR [--persistent] [--collection NAME] [--tenant ID] [--dir DIR]
+    python -m app.snapshot import --db-dir DIR [--persistent] [--collection NAME] [--tenant ID] [--dir DIR]
+
+--dir defaults to the tenant's snapshot directory; --collection (default
+jarvis_memory) names the collection inside --db-dir.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from app.config import SNAPSHOT_DIR, SNAPSHOT_PAGE_SIZE, SNAPSHOT_SERVE_WHILE_WARMING
+from app.jarvis_logger import logger
+from app.tenancy import ShardCache, current_tenant, snapshot_dir, tenant_scope, vector_dir
+from app.vector_browse import iter_entries
+from app.vector_store import COLLECTION_NAME, DB_DIR, last_written
+
+EMBEDDINGS_FILE = "embeddings.npy"
+COLUMNS_FILE = "columns.json"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def export_snapshot(collection, out_dir, page_size=SNAPSHOT_PAGE_SIZE, source=None, store_written_at=None):
+    """
+    Write a snapshot of `collection` to out_dir, paging through the store. Embeddings
+    are streamed to disk, so only the text columns are held in memory. Returns the manifest.
+
+    store_written_at is the store's write stamp read before the export started (0.0 if
+    it has none); snapshots without it are never served in place of the store.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    raw_path = os.path.join(out_dir, EMBEDDINGS_FILE + ".raw.tmp")
+    columns = {"ids": [], "documents": [], "metadatas": []}
+    dim = None
+
+    start = time.time()
+    with open(raw_path, "wb") as raw:
+        for entry in iter_entries(collection, page_size=page_size, fields=("ids", "documents", "metadatas", "embeddings")):
+            vector = np.asarray(entry["embedding"], dtype=np.float32)
+            if dim is None:
+                dim = vector.shape[0]
+            elif vector.shape[0] != dim:
+                raise ValueError(f"Embedding for {entry['id']} has dimension {vector.shape[0]}, expected {dim}")
+            raw.write(vector.tobytes())
+            columns["ids"].append(entry["id"])
+            columns["documents"].append(entry["document"])
+            columns["metadatas"].append(entry["metadata"])
+
+    count = len(columns["ids"])
+    tmp_npy = os.path.join(out_dir, EMBEDDINGS_FILE + ".tmp")
+    with open(tmp_npy, "wb") as f, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(
+            f, {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)), "fortran_order": False,
+                "shape": (count, dim or 0)})
+        shutil.copyfileobj(raw, f)
+    os.remove(raw_path)
+
+    tmp_columns = os.path.join(out_dir, COLUMNS_FILE + ".tmp")
+    with open(tmp_columns, "w") as f:
+        json.dump(columns, f, separators=(",", ":"), default=str)
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "count": count,
+        "dim": dim or 0,
+        "dtype": "float32",
+        "source": source,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    if store_written_at is not None:
+        manifest["store_written_at"] = store_written_at
+    tmp_manifest = os.path.join(out_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_npy, os.path.join(out_dir, EMBEDDINGS_FILE))
+    os.replace(tmp_columns, os.path.join(out_dir, COLUMNS_FILE))
+    os.replace(tmp_manifest, os.path.join(out_dir, MANIFEST_FILE))
+    logger.info(f"[SNAPSHOT] → Exported {count} entries ({dim}-d) to {out_dir} in {round(time.time() - start, 2)} sec")
+    return manifest
+
+
+def _matches(metadata, where):
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    return all(metadata.get(key) == value for key, value in where.items())
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot. Implements the subset of the Chroma collection API
+    that memory queries use (query, get by ids, count), with the same L2 ranking
+    Chroma uses by default.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(directory, COLUMNS_FILE)) as f:
+            columns = json.load(f)
+        self.ids = columns["ids"]
+        self.documents = columns["documents"]
+        self.metadatas = columns["metadatas"]
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        self._rows = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._norms = None
+        self._where_cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+    def count(self):
+        return len(self.ids)
+
+    def embedding(self, doc_id):
+        row = self._rows.get(doc_id)
+        return None if row is None else np.array(self.embeddings[row])
+
+    def _candidates(self, where):
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, default=str)
+        with self._lock:
+            rows = self._where_cache.get(key)
+        if rows is None:
+            rows = np.array([i for i, meta in enumerate(self.metadatas) if _matches(meta or {}, where)], dtype=np.int64)
+            with self._lock:
+                self._where_cache[key] = rows
+        return rows
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None, **_):
+        with self._lock:
+            if self._norms is None:
+                self._norms = np.einsum("ij,ij->i", self.embeddings, self.embeddings)
+            norms = self._norms
+        rows = self._candidates(where)
+
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in query_embeddings:
+            q = np.asarray(query, dtype=np.float32)
+            matrix = self.embeddings if rows is None else self.embeddings[rows]
+            row_norms = norms if rows is None else norms[rows]
+            distances = row_norms - 2 * (matrix @ q) + float(q @ q)
+            k = min(n_results, len(distances))
+            best = np.argpartition(distances, k - 1)[:k] if k else np.array([], dtype=np.int64)
+            best = best[np.argsort(distances[best])]
+            picked = best if rows is None else rows[best]
+            out["ids"].append([self.ids[i] for i in picked])
+            out["documents"].append([self.documents[i] for i in picked])
+            out["metadatas"].append([self.metadatas[i] for i in picked])
+            out["distances"].append([float(distances[i]) for i in best])
+        return out
+
+    def get(self, ids=None, **_):
+        rows = [self._rows[i] for i in (ids or self.ids) if i in self._rows]
+        return {"ids": [self.ids[i] for i in rows], "documents": [self.documents[i] for i in rows],
+                "metadatas": [self.metadatas[i] for i in rows]}
+
+
+def import_snapshot(collection, directory, batch_size=SNAPSHOT_PAGE_SIZE):
+    """
+    Upsert every snapshot entry into `collection` using the stored embeddings.
+    """
+    snap = Snapshot(directory)
+    start = time.time()
+    for begin in range(0, snap.count(), batch_size):
+        end = min(begin + batch_size, snap.count())
+        collection.upsert(
+            ids=snap.ids[begin:end],
+            embeddings=np.asarray(snap.embeddings[begin:end]).tolist(),
+            documents=snap.documents[begin:end],
+            metadatas=snap.metadatas[begin:end]
+        )
+    logger.info(f"[SNAPSHOT] → Imported {snap.count()} entries from {directory} in {round(time.time() - start, 2)} sec")
+    return snap.count()
+
+
+def export_tenant_snapshot(collection):
+    """
+    Snapshot the current tenant's store through `collection` (the server's
+    CollectionHandle) into its snapshot dir. Returns the manifest.
+    """
+    tenant = current_tenant()
+    written_at = last_written(vector_dir(tenant, DB_DIR)) or 0.0
+    return export_snapshot(collection.resolve(), snapshot_dir(tenant, SNAPSHOT_DIR),
+                           source=tenant, store_written_at=written_at)
+
+
+# ==== STARTUP INDEX ====
+
+_MISSING = object()
+_warm = set()
+_warming = set()
+_state_lock = threading.Lock()
+
+
+def _open_for_tenant(tenant):
+    directory = snapshot_dir(tenant, SNAPSHOT_DIR)
+    if not Snapshot.exists(directory):
+        return _MISSING
+    start = time.time()
+    snap = Snapshot(directory)
+    logger.info(f"[SNAPSHOT] → Loaded {snap.count()} entries for '{tenant}' in {round(time.time() - start, 3)} sec")
+    return snap
+
+
+_snapshots = ShardCache(_open_for_tenant)
+
+
+def load_for_tenant(tenant=None):
+    """
+    The current (or given) tenant's snapshot, or None if it has none.
+    """
+    snap = _snapshots.get(tenant or current_tenant())
+    return None if snap is _MISSING else snap
+
+
+def is_current(snap, tenant=None):
+    """
+    True if nothing has been written to the tenant's store since `snap` was exported.
+    """
+    exported_at = snap.manifest.get("store_written_at")
+    if exported_at is None:
+        return False
+    return (last_written(vector_dir(tenant or current_tenant(), DB_DIR)) or 0.0) <= exported_at
+
+
+def embedding_for(doc_id, tenant=None):
+    snap = load_for_tenant(tenant)
+    return None if snap is None else snap.embedding(doc_id)
+
+
+def _warm_store(tenant, collection, snap):
+    try:
+        with tenant_scope(tenant):
+            store = collection.resolve()
+            never_written = last_written(vector_dir(tenant, DB_DIR)) is None
+            if store.count() == 0 and (never_written or is_current(snap, tenant)):
+                logger.info(f"[SNAPSHOT] → Store for '{tenant}' is empty, restoring from snapshot")
+                import_snapshot(store, snap.directory)
+            # One real query pulls the index into memory before traffic switches over
+            store.query(query_embeddings=[np.asarray(snap.embeddings[0]).tolist()], n_results=1)
+        logger.info(f"[SNAPSHOT] → Store for '{tenant}' is warm, switching queries back to it")
+    except Exception as e:
+        logger.warning(f"[SNAPSHOT] → Warm-up for '{tenant}' failed ({e}); using the store directly")
+    with _state_lock:
+        _warm.add(tenant)
+        _warming.discard(tenant)
+
+
+def query_index(collection):
+    """
+    What memory queries should hit for the current tenant: its snapshot while the
+    store behind `collection` (a CollectionHandle) is still warming and the snapshot
+    is still current, else None. The first call per tenant starts the warm-up in
+    the background.
+    """
+    tenant = current_tenant()
+    with _state_lock:
+        if tenant in _warm or not SNAPSHOT_SERVE_WHILE_WARMING:
+            return None
+    snap = load_for_tenant(tenant)
+    if snap is None or not snap.count():
+        with _state_lock:
+            _warm.add(tenant)
+        return None
+    with _state_lock:
+        if tenant not in _warming:
+            _warming.add(tenant)
+            threading.Thread(target=_warm_store, args=(tenant, collection, snap),
+                             name=f"snapshot-warm-{tenant}", daemon=True).start()
+    # Checked on every call, so a write during warm-up switches queries to the store at once
+    return snap if is_current(snap, tenant) else None
+
+
+def _cli_collection(args):
+    if args.persistent:
+        import chromadb
+        client = chromadb.PersistentClient(path=args.db_dir)
+        return client.get_or_create_collection(args.collection)
+    from app.vector_store import open_local_collection
+    return open_local_collection(args.db_dir, args.collection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a vector-store snapshot")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--tenant", help="tenant id (default tenant if omitted)")
+    parser.add_argument("--dir", help="snapshot directory (defaults to the tenant's snapshot dir)")
+    parser.add_argument("--db-dir", required=True,
+                        help="store directory; the server must not be running on it (use POST /snapshot for a live store)")
+    parser.add_argument("--persistent", action="store_true",
+                        help="open --db-dir with chromadb.PersistentClient (master_script's store)")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="collection inside --db-dir")
+    args = parser.parse_args()
+
+    with tenant_scope(args.tenant):
+        directory = args.dir or snapshot_dir(current_tenant(), SNAPSHOT_DIR)
+        collection = _cli_collection(args)
+        if args.command == "export":
+            # master_script's store isn't stamped on write, so its snapshots never stand in for a store
+            written_at = None if args.persistent else (last_written(args.db_dir) or 0.0)
+            export_snapshot(collection, directory, source=args.db_dir, store_written_at=written_at)
+        else:
+            import_snapshot(collection, directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+stream_stt.py
+
+Incremental transcription for audio streamed over WebSocket while the user is still speaking.
+Voice-activity detection finds the end of the utterance; Whisper runs periodically on the
+not-yet-committed tail of the buffer, so only a short remainder is left to decode once
+speech stops.
+"""
+
+import json
+import time
+
+import numpy as np
+
+from app.config import (
+    STREAM_SAMPLE_RATE,
+    STREAM_ALLOWED_SAMPLE_RATES,
+    STREAM_FRAME_MS,
+    STREAM_END_SILENCE_MS,
+    STREAM_PARTIAL_INTERVAL_SECONDS,
+    STREAM_COMMIT_MARGIN_SECONDS,
+    STREAM_MAX_UTTERANCE_SECONDS,
+    STREAM_VAD_AGGRESSIVENESS,
+    STREAM_ENERGY_THRESHOLD,
+    STREAM_STT_PROFILE,
+    STT_PROFILES
+)
+from app.whisper_stt import transcribe_timed
+from app.audio_decode import resample
+from app.jarvis_logger import logger
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+
+class VoiceActivityDetector:
+    """
+    Frame-level speech detector. Uses webrtcvad when installed, otherwise an
+    RMS energy gate with a slowly adapting noise floor.
+    """
+
+    def __init__(self, sample_rate=STREAM_SAMPLE_RATE, frame_ms=STREAM_FRAME_MS):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.vad = webrtcvad.Vad(STREAM_VAD_AGGRESSIVENESS) if webrtcvad else None
+        self.noise_floor = None
+
+    def is_speech(self, frame):
+        """
+        frame: int16 array of exactly frame_samples samples.
+        """
+        if self.vad is not None:
+            return self.vad.is_speech(frame.tobytes(), self.sample_rate)
+
+        rms = float(np.sqrt(np.mean((frame.astype(np.float32) / 32768.0) ** 2)))
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        threshold = max(STREAM_ENERGY_THRESHOLD, self.noise_floor * 3)
+        speech = rms > threshold
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return speech
+
+
+class StreamProtocolError(ValueError):
+    """Raised for a malformed or unsupported control message from the client."""
+
+
+def parse_control(text):
+    """
+    Parse and validate a client control message. Returns {"event", "sample_rate", "profile"}.
+    """
+    try:
+        control = json.loads(text)
+    except ValueError:
+        raise StreamProtocolError("control message is not valid JSON")
+    if not isinstance(control, dict):
+        raise StreamProtocolError("control message must be a JSON object")
+
+    event = control.get("event")
+    if event not in ("start", "end"):
+        raise StreamProtocolError(f"unknown event: {event!r}")
+
+    sample_rate = control.get("sample_rate", STREAM_SAMPLE_RATE)
+    if isinstance(sample_rate, bool) or sample_rate not in STREAM_ALLOWED_SAMPLE_RATES:
+        raise StreamProtocolError(f"sample_rate must be one of {STREAM_ALLOWED_SAMPLE_RATES}")
+
+    profile = control.get("profile") or STREAM_STT_PROFILE
+    if profile != "auto" and profile not in STT_PROFILES:
+        raise StreamProtocolError(f"unknown profile: {profile!r}")
+
+    return {"event": event, "sample_rate": int(sample_rate), "profile": profile}
+
+
+class StreamingTranscriber:
+    """
+    Accumulates int16 PCM chunks for one utterance.
+
+    feed() returns an optional partial transcript and sets `ended` once the VAD
+    has seen enough trailing silence. finalize() decodes whatever hasn't been
+    committed yet and returns the full transcript.
+    """
+
+    def __init__(self, sample_rate=STREAM_SAMPLE_RATE, profile=STREAM_STT_PROFILE):
+        self.input_rate = sample_rate
+        self.profile = profile
+        self.vad = VoiceActivityDetector()
+        self.audio = np.zeros(0, dtype=np.int16)
+        self._pending = np.zeros(0, dtype=np.int16)  # samples not yet run through the VAD
+        self.committed = []           # stable segment texts
+        self.committed_samples = 0    # audio before this offset is already transcribed
+        self.decoded_at = 0           # buffer length at the last partial decode
+        self.speech_started = False
+        self.silence_ms = 0
+        self.ended = False
+        self.speech_ended_at = None
+        self.partial_decodes = 0
+        self.partial_decode_sec = 0.0
+
+    @property
+    def duration(self):
+        return len(self.audio) / STREAM_SAMPLE_RATE
+
+    def feed(self, chunk):
+        """
+        Add a chunk of little-endian int16 PCM bytes. Returns a partial transcript or None.
+        """
+        if self.ended:
+            return None
+        samples = np.frombuffer(chunk, dtype="<i2").astype(np.int16)
+        samples = resample(samples, self.input_rate)
+        self.audio = np.concatenate([self.audio, samples])
+        self._run_vad(samples)
+
+        if self.ended:
+            return None
+        if self.duration >= STREAM_MAX_UTTERANCE_SECONDS:
+            logger.info("[STT] → Stream hit max utterance length, finalizing")
+            self._mark_ended()
+            return None
+
+        new_audio_sec = (len(self.audio) - self.decoded_at) / STREAM_SAMPLE_RATE
+        if self.speech_started and new_audio_sec >= STREAM_PARTIAL_INTERVAL_SECONDS:
+            return self._partial_decode()
+        return None
+
+    def _run_vad(self, samples):
+        frame_len = self.vad.frame_samples
+        self._pending = np.concatenate([self._pending, samples])
+        usable = len(self._pending) - len(self._pending) % frame_len
+        for start in range(0, usable, frame_len):
+            if self.vad.is_speech(self._pending[start:start + frame_len]):
+                self.speech_started = True
+                self.silence_ms = 0
+            elif self.speech_started:
+                self.silence_ms += STREAM_FRAME_MS
+                if self.silence_ms >= STREAM_END_SILENCE_MS:
+                    self._mark_ended()
+                    break
+        self._pending = self._pending[usable:]
+
+    def _mark_ended(self):
+        self.ended = True
+        self.speech_ended_at = time.monotonic()
+
+    def _decode_tail(self):
+        tail = self.audio[self.committed_samples:].astype(np.float32) / 32768.0
+        prompt = " ".join(self.committed[-3:]) or None
+        return list(transcribe_timed(tail, initial_prompt=prompt, profile=self.profile))
+
+    def _partial_decode(self):
+        start = time.monotonic()
+        self.decoded_at = len(self.audio)
+        segments = self._decode_tail()
+        tail_sec = (len(self.audio) - self.committed_samples) / STREAM_SAMPLE_RATE
+
+        # Leading segments that end well before the live edge won't change; commit them.
+        # Segment times are relative to the start of the decoded tail.
+        commit_until = 0.0
+        uncommitted = []
+        for seg in segments:
+            text = seg.text.strip()
+            if not uncommitted and seg.end <= tail_sec - STREAM_COMMIT_MARGIN_SECONDS:
+                if text:
+                    self.committed.append(text)
+                commit_until = seg.end
+            elif text:
+                uncommitted.append(text)
+        self.committed_samples += int(commit_until * STREAM_SAMPLE_RATE)
+        self.partial_decodes += 1
+        self.partial_decode_sec += time.monotonic() - start
+        return " ".join(self.committed + uncommitted).strip()
+
+    def finalize(self):
+        """
+        Decode the uncommitted remainder and return (transcript, stats).
+        """
+        if not self.ended:
+            self._mark_ended()
+        start = time.monotonic()
+        remainder = []
+        if len(self.audio) > self.committed_samples and self.speech_started:
+            remainder = [seg.text.strip() for seg in self._decode_tail() if seg.text.strip()]
+        finalize_sec = time.monotonic() - start
+        transcript = " ".join(self.committed + remainder).strip()
+        stats = {
+            "audio_sec": round(self.duration, 2),
+            "partial_decodes": self.partial_decodes,
+            "partial_decode_sec": round(self.partial_decode_sec, 3),
+            "committed_sec": round(self.committed_samples / STREAM_SAMPLE_RATE, 2),
+            "finalize_sec": round(finalize_sec, 3)
+        }
+        return transcript, stats
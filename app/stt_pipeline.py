@@ -0,0 +1,124 @@
+"""
+stt_pipeline.py
+
+Overlapped STT → retrieval → LLM pipeline for voice commands.
+Memory retrieval starts on each finalized Whisper segment while the rest of the clip
+is still being decoded, and the LLM request path is warmed concurrently.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.config import STT_RETRIEVAL_WORKERS
+from app.metrics import run_attributed
+from app.stt_pool import pool_size
+from app.whisper_stt import transcribe_segments
+from app.llm_handler import retrieve_memory, merge_memory, load_prompt_template
+from app.model_warmth import ensure_warm
+from app.jarvis_logger import logger
+
+# Shared by all requests; one per concurrent transcription by default so requests don't queue behind each other
+_retrieval_executor = ThreadPoolExecutor(max_workers=STT_RETRIEVAL_WORKERS or pool_size()[0],
+                                         thread_name_prefix="stt-retrieval")
+
+
+class _RetrievalChain:
+    """
+    Per-request retrieval queue: a request's segments are retrieved one at a time and
+    in order, on at most one executor thread, while other requests use the rest.
+    """
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._lock:
+            self._pending.append((future, contextvars.copy_context(), fn, args))
+            if self._running:
+                return future
+            self._running = True
+        self._executor.submit(self._drain)
+        return future
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                future, ctx, fn, args = self._pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                # Run in the submitter's context so retrieval sees its tenant, trace flag and profile
+                future.set_result(ctx.run(run_attributed, fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+def _timed_retrieval(text):
+    start = time.monotonic()
+    slices = retrieve_memory(text)
+    return slices, start, time.monotonic()
+
+
+def run_pipelined(audio, profile=None):
+    """
+    Transcribe audio (file path or decoded array) while retrieving memory for each finalized segment.
+    Returns (transcription, memory_slices, timings) where timings reports per-stage
+    durations and how much retrieval work overlapped with decoding.
+    """
+    t0 = time.monotonic()
+
+    # Warm the LLM request path while Whisper is busy
+    llm_state = ensure_warm()
+    try:
+        load_prompt_template()
+    except OSError as e:
+        logger.warning(f"[PIPELINE] → Could not preload prompt template: {e}")
+
+    segments = []
+    futures = []
+    chain = _RetrievalChain(_retrieval_executor)
+    first_segment_at = None
+    for text in transcribe_segments(audio, profile):
+        if first_segment_at is None:
+            first_segment_at = time.monotonic()
+        segments.append(text)
+        futures.append(chain.submit(_timed_retrieval, text))
+    stt_end = time.monotonic()
+
+    transcription = " ".join(segments).strip()
+    logger.info(f"[STT] → Result: {transcription}")
+
+    results = [f.result() for f in futures]
+    retrieval_end = time.monotonic()
+
+    memory_slices = merge_memory(*[slices for slices, _, _ in results])
+    retrieval_busy = sum(end - start for _, start, end in results)
+    retrieval_overlap = sum(max(0.0, min(end, stt_end) - start) for _, start, end in results)
+
+    timings = {
+        "mode": "pipelined",
+        "stt_profile": profile,
+        "segments": len(segments),
+        "stt": round(stt_end - t0, 3),
+        "first_segment": round(first_segment_at - t0, 3) if first_segment_at else None,
+        "retrieval": round(retrieval_busy, 3),
+        "retrieval_overlap": round(retrieval_overlap, 3),
+        "retrieval_tail": round(retrieval_end - stt_end, 3),
+        "llm_state_at_start": llm_state
+    }
+    logger.info(
+        f"[PIPELINE] → STT {timings['stt']}s, retrieval {timings['retrieval']}s "
+        f"({timings['retrieval_overlap']}s overlapped, {timings['retrieval_tail']}s after STT), "
+        f"LLM was {llm_state}"
+    )
+    return transcription, memory_slices, timings
@@ -0,0 +1,189 @@
+"""
+stt_pool.py
+
+Bounded worker pool for Whisper transcription. Concurrent voice commands wait in a
+job queue instead of contending for CPU unpredictably; each worker gets a fixed share
+of cores (cpu_threads) and models are loaded with num_workers equal to the pool size
+so CTranslate2 can run that many transcriptions in parallel on one set of weights.
+Queue depth, utilisation and wait/run times are tracked for /stt-pool.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from app.config import (
+    STT_POOL_WORKERS,
+    STT_CPU_THREADS_PER_WORKER,
+    STT_QUEUE_MAX,
+    STT_JOB_TIMEOUT_SECONDS
+)
+from app.jarvis_logger import logger
+from app.metrics import register_gauge, attributed, current_profiler
+
+_DONE = object()
+
+
+class STTQueueFull(Exception):
+    """Raised when the job queue is at capacity; callers should shed load."""
+
+
+class STTJobTimeout(Exception):
+    """Raised when a job doesn't finish within its timeout (queue wait included)."""
+
+
+def pool_size():
+    """
+    Return (workers, cpu_threads_per_worker) for this machine.
+    """
+    cores = os.cpu_count() or 1
+    threads = max(1, min(STT_CPU_THREADS_PER_WORKER, cores))
+    workers = STT_POOL_WORKERS or max(1, cores // threads)
+    return workers, threads
+
+
+class _Job:
+    def __init__(self, fn):
+        self.fn = fn
+        self.out = queue.Queue()
+        self.cancelled = threading.Event()
+        self.submitted_at = time.monotonic()
+        self.profiler = current_profiler()
+
+    def emit(self, item):
+        """
+        Hand one result item to the caller. Returns False once the caller has given up.
+        """
+        if self.cancelled.is_set():
+            return False
+        self.out.put(item)
+        return True
+
+
+class STTWorkerPool:
+    def __init__(self, workers, queue_max=STT_QUEUE_MAX):
+        self.workers = workers
+        self.jobs = queue.Queue(maxsize=queue_max)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._busy_since = {}
+        self._busy_total = 0.0
+        self._started_at = time.monotonic()
+        self._counts = {"submitted": 0, "completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+        for i in range(workers):
+            threading.Thread(target=self._worker, args=(i,), name=f"stt-worker-{i}", daemon=True).start()
+        logger.info(f"[STT] → Worker pool started with {workers} worker(s)")
+
+    def _worker(self, index):
+        while True:
+            job = self.jobs.get()
+            if job.cancelled.is_set():
+                continue
+            start = time.monotonic()
+            with self._lock:
+                self._busy += 1
+                self._busy_since[index] = start
+                self._wait_times.append(start - job.submitted_at)
+            try:
+                with attributed(job.profiler):
+                    job.fn(job.emit)
+                job.out.put(_DONE)
+                outcome = "completed"
+            except Exception as e:
+                job.out.put(e)
+                outcome = "failed"
+                logger.exception("[STT] → Worker job failed")
+            end = time.monotonic()
+            with self._lock:
+                self._busy -= 1
+                self._busy_total += end - start
+                self._busy_since.pop(index, None)
+                self._run_times.append(end - start)
+                self._counts[outcome] += 1
+
+    def stream(self, fn, timeout=STT_JOB_TIMEOUT_SECONDS):
+        """
+        Run fn(emit) on a worker and yield every item it emits, in order.
+        Raises STTQueueFull if the queue is at capacity and STTJobTimeout if the
+        job (including time spent queued) exceeds `timeout`.
+        """
+        job = _Job(fn)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._counts["rejected"] += 1
+            raise STTQueueFull(f"STT queue full ({self.jobs.maxsize} jobs waiting)")
+        with self._lock:
+            self._counts["submitted"] += 1
+
+        deadline = job.submitted_at + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = job.out.get(timeout=max(0.0, remaining))
+                except queue.Empty:
+                    with self._lock:
+                        self._counts["timed_out"] += 1
+                    raise STTJobTimeout(f"STT job exceeded {timeout}s")
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Covers timeouts and callers that stop iterating early
+            job.cancelled.set()
+
+    def run(self, fn, timeout=STT_JOB_TIMEOUT_SECONDS):
+        """
+        Run fn(emit) on a worker and return the list of emitted items.
+        """
+        return list(self.stream(fn, timeout))
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._lock:
+            busy_total = self._busy_total + sum(now - since for since in self._busy_since.values())
+            uptime = now - self._started_at
+            waits = sorted(self._wait_times)
+            runs = list(self._run_times)
+            return {
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "queue_depth": self.jobs.qsize(),
+                "queue_max": self.jobs.maxsize,
+                "utilisation": round(busy_total / (uptime * self.workers), 3) if uptime else 0.0,
+                **self._counts,
+                "wait_avg": round(sum(waits) / len(waits), 3) if waits else None,
+                "wait_p95": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 3) if waits else None,
+                "run_avg": round(sum(runs) / len(runs), 3) if runs else None
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process-wide pool, starting it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = STTWorkerPool(pool_size()[0])
+        return _pool
+
+
+def _pool_gauge(key):
+    return lambda: get_pool().metrics()[key] if _pool is not None else 0
+
+
+register_gauge("jarvis_stt_queue_depth", "STT jobs waiting for a worker.", _pool_gauge("queue_depth"))
+register_gauge("jarvis_stt_busy_workers", "STT workers currently transcribing.", _pool_gauge("busy_workers"))
@@ -0,0 +1,84 @@
+"""
+stt_telemetry.py
+
+Per-profile STT statistics: real-time factor (processing time / audio duration) and
+transcript agreement between profiles, measured by re-transcribing a sample of
+requests with the other profile. Used to tune the speed/accuracy trade-off.
+"""
+
+import threading
+from collections import deque
+
+from app.config import STT_TELEMETRY_WINDOW
+
+_lock = threading.Lock()
+_runs = {}        # profile -> deque of (audio_sec, elapsed_sec)
+_agreement = {}   # "fast_vs_accurate" -> deque of (agreement, exact_match)
+
+
+def _words(text):
+    return [w.strip(".,!?;:\"'").lower() for w in (text or "").split() if w.strip(".,!?;:\"'")]
+
+
+def word_agreement(reference, hypothesis):
+    """
+    1 - word error rate of hypothesis against reference, floored at 0.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 1.0 if not hyp else 0.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return max(0.0, 1.0 - prev[-1] / len(ref))
+
+
+def record_run(profile, audio_sec, elapsed_sec):
+    if not audio_sec:
+        return
+    with _lock:
+        _runs.setdefault(profile, deque(maxlen=STT_TELEMETRY_WINDOW)).append((audio_sec, elapsed_sec))
+
+
+def record_agreement(profile, text, reference_profile, reference_text):
+    key = f"{profile}_vs_{reference_profile}"
+    score = word_agreement(reference_text, text)
+    with _lock:
+        _agreement.setdefault(key, deque(maxlen=STT_TELEMETRY_WINDOW)).append(
+            (score, _words(text) == _words(reference_text))
+        )
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+
+def stats():
+    """
+    Snapshot of per-profile RTF and cross-profile agreement.
+    """
+    with _lock:
+        runs = {k: list(v) for k, v in _runs.items()}
+        agreement = {k: list(v) for k, v in _agreement.items()}
+
+    report = {"profiles": {}, "agreement": {}}
+    for profile, samples in runs.items():
+        rtfs = [elapsed / audio for audio, elapsed in samples]
+        report["profiles"][profile] = {
+            "runs": len(samples),
+            "audio_sec": round(sum(a for a, _ in samples), 1),
+            "rtf_mean": round(sum(rtfs) / len(rtfs), 3),
+            "rtf_p50": round(_pct(rtfs, 50), 3),
+            "rtf_p95": round(_pct(rtfs, 95), 3)
+        }
+    for key, samples in agreement.items():
+        report["agreement"][key] = {
+            "samples": len(samples),
+            "mean_agreement": round(sum(s for s, _ in samples) / len(samples), 3),
+            "exact_match_rate": round(sum(1 for _, exact in samples if exact) / len(samples), 3)
+        }
+    return report
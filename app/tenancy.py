@@ -0,0 +1,352 @@
+"""
+tenancy.py
+
+Per-household (tenant) scoping. The current tenant is a context variable set per
+request, so code deeper in the stack (io_utils, memory_manager) picks the right
+shard without passing it around; executors must copy the context to keep it.
+
+Only tenants listed in the registry (TENANT_REGISTRY) are served, and requests for
+them must carry the tenant's key; the default tenant needs neither. Manage it with:
+    python -m app.tenancy add|remove|list [ID]
+
+Each non-default tenant gets its own directory under TENANT_ROOT:
+    tenants/<tenant>/data/{inventory,shopping,todo}.json
+    tenants/<tenant>/vector_store/
+Shards are created on the first write, never by reads. Open vector-store handles
+are kept in an LRU (ShardCache) so memory stays bounded however many tenants there
+are. Quotas cap rows per data file and memory entries per tenant.
+"""
+
+import argparse
+import contextvars
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.config import (
+    DEFAULT_TENANT,
+    TENANT_HEADER,
+    TENANT_KEY_HEADER,
+    TENANT_ROOT,
+    TENANT_REGISTRY,
+    TENANT_MAX_OPEN_SHARDS,
+    TENANT_QUOTA_ROWS,
+    TENANT_QUOTA_MEMORY_ENTRIES
+)
+from app.jarvis_logger import logger
+
+_TENANT_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+_tenant = contextvars.ContextVar("jarvis_tenant", default=DEFAULT_TENANT)
+
+
+class TenantError(ValueError):
+    """Raised for a malformed tenant id."""
+
+
+class TenantAccessDenied(TenantError):
+    """Raised for a tenant that isn't registered or a missing/wrong tenant key."""
+
+
+class QuotaExceeded(Exception):
+    """Raised when a write would take a tenant past one of its quotas."""
+
+
+def requested_tenant(headers, args, form=None):
+    """
+    Tenant named by a request: the tenant header, then ?tenant=, then a "tenant" form field.
+    """
+    return headers.get(TENANT_HEADER) or args.get("tenant") or (form or {}).get("tenant")
+
+
+def requested_tenant_key(headers, args, form=None):
+    """
+    Key sent with the request: the key header, then ?tenant_key=, then a "tenant_key" form field.
+    """
+    return headers.get(TENANT_KEY_HEADER) or args.get("tenant_key") or (form or {}).get("tenant_key")
+
+
+def validate_tenant(tenant):
+    tenant = (tenant or DEFAULT_TENANT).strip().lower()
+    if not _TENANT_RE.match(tenant):
+        raise TenantError(f"Invalid tenant id: {tenant!r}")
+    return tenant
+
+
+def current_tenant():
+    return _tenant.get()
+
+
+def set_tenant(tenant):
+    """
+    Make `tenant` current for this context. Returns a token for reset_tenant.
+    """
+    return _tenant.set(validate_tenant(tenant))
+
+
+def reset_tenant(token):
+    _tenant.reset(token)
+
+
+# ==== REGISTRY ====
+
+_registry = {"mtime": None, "tenants": {}}
+_registry_lock = threading.Lock()
+
+
+def _hash_key(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_registry(path=TENANT_REGISTRY):
+    """
+    {tenant: {"key_sha256": ..., "created_at": ...}}, re-read only when the file changes.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _registry_lock:
+        if _registry["mtime"] != mtime:
+            with open(path, "r") as f:
+                _registry["tenants"] = json.load(f)
+            _registry["mtime"] = mtime
+        return _registry["tenants"]
+
+
+def set_request_tenant(tenant, key):
+    """
+    Like set_tenant, for a tenant named by a client: it must be the default tenant or
+    a registered one with the matching key. Returns a token for reset_tenant.
+    """
+    tenant = validate_tenant(tenant)
+    if not is_default(tenant):
+        entry = load_registry().get(tenant)
+        # Same error for unknown tenants and wrong keys, so ids can't be probed
+        if entry is None or not key or not hmac.compare_digest(entry["key_sha256"], _hash_key(key)):
+            raise TenantAccessDenied(f"Unknown tenant or wrong key: {tenant!r}")
+    return _tenant.set(tenant)
+
+
+@contextmanager
+def tenant_scope(tenant):
+    token = set_tenant(tenant)
+    try:
+        yield current_tenant()
+    finally:
+        reset_tenant(token)
+
+
+def is_default(tenant=None):
+    return (tenant or current_tenant()) == DEFAULT_TENANT
+
+
+def tenant_dir(tenant=None):
+    return os.path.join(TENANT_ROOT, tenant or current_tenant())
+
+
+def data_path(key, default_path, create=False):
+    """
+    Path of a data file for the current tenant. The default tenant keeps `default_path`;
+    other tenants get their own copy, which is only created (empty) if `create` is set,
+    so reads never add shards.
+    """
+    tenant = current_tenant()
+    if is_default(tenant):
+        return default_path
+    path = os.path.join(tenant_dir(tenant), "data", os.path.basename(default_path))
+    if create and not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("[]")
+        logger.info(f"[TENANT] → Created {key} shard for '{tenant}'")
+    return path
+
+
+def vector_dir(tenant, default_dir):
+    return default_dir if is_default(tenant) else os.path.join(tenant_dir(tenant), "vector_store")
+
+
+def snapshot_dir(tenant, default_dir):
+    return default_dir if is_default(tenant) else os.path.join(tenant_dir(tenant), "vector_snapshot")
+
+
+def check_rows_quota(key, rows, current_count):
+    """
+    Reject a write that would grow `key` past the row quota. Writes that don't add
+    rows always go through, so a tenant over quota (e.g. after it was lowered) can
+    still edit and delete. current_count() is only called for writes over quota.
+    """
+    if is_default() or TENANT_QUOTA_ROWS is None or len(rows) <= TENANT_QUOTA_ROWS:
+        return
+    if len(rows) > current_count():
+        raise QuotaExceeded(f"{key} is limited to {TENANT_QUOTA_ROWS} entries for this household")
+
+
+def memory_quota_reached(count_entries):
+    """
+    True if the current tenant is at its memory quota. count_entries() is only
+    called when a quota applies, so the default tenant pays nothing.
+    """
+    if is_default() or TENANT_QUOTA_MEMORY_ENTRIES is None:
+        return False
+    return count_entries() >= TENANT_QUOTA_MEMORY_ENTRIES
+
+
+class ShardCache:
+    """
+    LRU of open per-tenant handles. `opener(tenant)` creates one; `closer(handle)`,
+    if given, is called when a handle is evicted.
+
+    A tenant is only ever opened by one thread at a time and is never reopened until
+    its evicted handle has finished closing, so two handles never share a directory.
+    Use lease() rather than get() when the handle is used after the call returns:
+    evicting a leased handle is deferred until the last lease ends.
+    """
+
+    def __init__(self, opener, capacity=TENANT_MAX_OPEN_SHARDS, closer=None):
+        self.opener = opener
+        self.capacity = capacity
+        self.closer = closer
+        self._handles = OrderedDict()
+        self._leases = {}      # tenant -> active leases on its current handle
+        self._retired = {}     # tenant -> handle evicted while leased
+        self._closing = {}     # tenant -> Event set once its evicted handle is closed
+        self._tenant_locks = {}
+        self._lock = threading.Lock()
+
+    def _tenant_lock(self, tenant):
+        with self._lock:
+            return self._tenant_locks.setdefault(tenant, threading.Lock())
+
+    def _take(self, tenant, lease):
+        # Caller holds self._lock
+        handle = self._handles.get(tenant)
+        if handle is None and tenant in self._retired:
+            # Evicted but still in use: bring it back rather than opening a second one
+            # (capacity is re-applied on the next open)
+            handle = self._handles[tenant] = self._retired.pop(tenant)
+        if handle is not None:
+            self._handles.move_to_end(tenant)
+            if lease:
+                self._leases[tenant] = self._leases.get(tenant, 0) + 1
+        return handle
+
+    def _acquire(self, tenant, lease):
+        with self._lock:
+            handle = self._take(tenant, lease)
+        if handle is not None:
+            return handle
+        # Open outside the cache lock (opening a store can be slow) but under the tenant's own lock
+        with self._tenant_lock(tenant):
+            while True:
+                with self._lock:
+                    handle = self._take(tenant, lease)
+                    closing = self._closing.get(tenant)
+                if handle is not None:
+                    return handle
+                if closing is None:
+                    break
+                # The previous handle is still being closed (e.g. persisting); open after it's done
+                closing.wait()
+            handle = self.opener(tenant)
+            with self._lock:
+                self._handles[tenant] = handle
+                if lease:
+                    self._leases[tenant] = self._leases.get(tenant, 0) + 1
+                evicted = []
+                while len(self._handles) > self.capacity:
+                    old_tenant, old_handle = self._handles.popitem(last=False)
+                    if self._leases.get(old_tenant):
+                        self._retired[old_tenant] = old_handle
+                    else:
+                        self._closing[old_tenant] = threading.Event()
+                        evicted.append((old_tenant, old_handle))
+        for old_tenant, old_handle in evicted:
+            self._close(old_tenant, old_handle)
+        return handle
+
+    def _close(self, tenant, handle):
+        # Caller registered self._closing[tenant] under self._lock when it evicted the handle
+        logger.info(f"[TENANT] → Closing idle shard for '{tenant}'")
+        try:
+            if self.closer:
+                self.closer(handle)
+        except Exception as e:
+            logger.warning(f"[TENANT] → Failed to close shard for '{tenant}': {e}")
+        finally:
+            with self._lock:
+                done = self._closing.pop(tenant)
+            done.set()
+
+    def get(self, tenant):
+        return self._acquire(tenant, lease=False)
+
+    @contextmanager
+    def lease(self, tenant):
+        handle = self._acquire(tenant, lease=True)
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                self._leases[tenant] -= 1
+                if not self._leases[tenant]:
+                    del self._leases[tenant]
+                retired = tenant not in self._leases and self._retired.get(tenant) is handle
+                if retired:
+                    del self._retired[tenant]
+                    self._closing[tenant] = threading.Event()
+            if retired:
+                self._close(tenant, handle)
+
+    def __len__(self):
+        return len(self._handles)
+
+
+def _write_registry(tenants, path=TENANT_REGISTRY):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(tenants, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the tenant registry")
+    parser.add_argument("command", choices=["add", "remove", "list"])
+    parser.add_argument("tenant", nargs="?")
+    args = parser.parse_args()
+
+    tenants = dict(load_registry())
+    if args.command == "list":
+        for tenant, entry in sorted(tenants.items()):
+            print(f"{tenant}\t{entry.get('created_at', '')}")
+        return
+    if not args.tenant:
+        parser.error(f"{args.command} needs a tenant id")
+    tenant = validate_tenant(args.tenant)
+    if is_default(tenant):
+        parser.error("the default tenant doesn't need registering")
+
+    if args.command == "add":
+        # Re-adding a tenant issues a new key and revokes the old one
+        key = secrets.token_urlsafe(24)
+        tenants[tenant] = {"key_sha256": _hash_key(key), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        _write_registry(tenants)
+        print(f"Registered '{tenant}'. Send this key as {TENANT_KEY_HEADER} (shown once): {key}")
+    else:
+        if tenants.pop(tenant, None) is None:
+            parser.error(f"'{tenant}' is not registered")
+        _write_registry(tenants)
+        print(f"Removed '{tenant}' from the registry; its data under {tenant_dir(tenant)} is left in place")
+
+
+if __name__ == "__main__":
+    main()
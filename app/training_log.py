@@ -0,0 +1,217 @@
+"""
+training_log.py
+
+Append-only log of user commands and LLM responses, kept for fine-tuning.
+
+Entries are buffered in memory and flushed when the buffer reaches
+TRAINING_LOG_FLUSH_BYTES or TRAINING_LOG_FLUSH_SECONDS have passed. Each flush is
+written as one gzip member appended to the current segment (segment-NNNNNN.jsonl.gz),
+so a segment is still a normal gzip file (zcat works). Segments rotate at
+TRAINING_LOG_SEGMENT_MAX_BYTES.
+
+A sidecar index.jsonl gets one line per flushed block: segment, byte offset and
+length, record count, first/last timestamp and per-action counts. Readers use it to
+seek straight to the blocks that can match a time range or action and only
+decompress those.
+
+Usage: python -m app.training_log [--since ISO] [--until ISO] [--action NAME]
+"""
+
+import argparse
+import atexit
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+from app.config import (
+    TRAINING_LOG_DIR,
+    TRAINING_LOG_FLUSH_BYTES,
+    TRAINING_LOG_FLUSH_SECONDS,
+    TRAINING_LOG_SEGMENT_MAX_BYTES
+)
+from app.jarvis_logger import logger
+
+INDEX_FILE = "index.jsonl"
+_SEGMENT_RE = re.compile(r"segment-(\d+)\.jsonl\.gz$")
+
+
+def entry_action(entry):
+    """
+    The action an entry was parsed into, or None for free-text/unparsed responses.
+    """
+    parsed = entry.get("llm_response_json")
+    if isinstance(parsed, dict):
+        return parsed.get("action")
+    return None
+
+
+def _segment_name(number):
+    return f"segment-{number:06d}.jsonl.gz"
+
+
+def _as_timestamp(value):
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+class TrainingLogWriter:
+    def __init__(self, directory=TRAINING_LOG_DIR, flush_bytes=TRAINING_LOG_FLUSH_BYTES,
+                 flush_seconds=TRAINING_LOG_FLUSH_SECONDS, segment_max_bytes=TRAINING_LOG_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._lines = []
+        self._size = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._actions = Counter()
+        self._timer = None
+
+        os.makedirs(directory, exist_ok=True)
+        numbers = [int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(directory)) if m]
+        self._segment = max(numbers) if numbers else 1
+
+    def append(self, entry):
+        """
+        Buffer one entry; it reaches disk on the next size- or time-triggered flush.
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        timestamp = entry.get("timestamp") or datetime.now().isoformat()
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line)
+            self._first_ts = self._first_ts or timestamp
+            self._last_ts = timestamp
+            self._actions[str(entry_action(entry))] += 1
+            if self._size >= self.flush_bytes:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._lines:
+            return
+
+        block = gzip.compress("".join(self._lines).encode("utf-8"))
+        path = os.path.join(self.directory, _segment_name(self._segment))
+        if os.path.exists(path) and os.path.getsize(path) + len(block) > self.segment_max_bytes:
+            self._segment += 1
+            path = os.path.join(self.directory, _segment_name(self._segment))
+            logger.info(f"[TRAINING] → Rotated to {path}")
+
+        try:
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(block)
+            index_entry = {
+                "segment": os.path.basename(path),
+                "offset": offset,
+                "length": len(block),
+                "records": len(self._lines),
+                "first_ts": self._first_ts,
+                "last_ts": self._last_ts,
+                "actions": dict(self._actions)
+            }
+            with open(os.path.join(self.directory, INDEX_FILE), "a") as f:
+                f.write(json.dumps(index_entry) + "\n")
+        except OSError as e:
+            logger.error(f"[TRAINING] → Failed to write {len(self._lines)} entries: {e}")
+            return
+
+        self._lines = []
+        self._size = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._actions = Counter()
+
+
+def read_index(directory=TRAINING_LOG_DIR):
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def iter_entries(directory=TRAINING_LOG_DIR, since=None, until=None, action=None):
+    """
+    Stream logged entries in write order, optionally filtered by timestamp range
+    (inclusive, ISO strings or datetimes) and by action name. Blocks whose index
+    entry rules them out are never read or decompressed.
+    """
+    since, until = _as_timestamp(since), _as_timestamp(until)
+    for block in read_index(directory):
+        if since and block["last_ts"] < since:
+            continue
+        if until and block["first_ts"] > until:
+            continue
+        if action and not block["actions"].get(action):
+            continue
+
+        with open(os.path.join(directory, block["segment"]), "rb") as f:
+            f.seek(block["offset"])
+            data = gzip.decompress(f.read(block["length"]))
+
+        for line in data.decode("utf-8").splitlines():
+            entry = json.loads(line)
+            timestamp = entry.get("timestamp", "")
+            if since and timestamp < since:
+                continue
+            if until and timestamp > until:
+                continue
+            if action and entry_action(entry) != action:
+                continue
+            yield entry
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Return the process-wide writer; it is flushed at exit.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = TrainingLogWriter()
+            atexit.register(_writer.flush)
+        return _writer
+
+
+def log_interaction(entry):
+    get_writer().append(entry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export training log entries as JSON lines")
+    parser.add_argument("--dir", default=TRAINING_LOG_DIR)
+    parser.add_argument("--since", help="ISO timestamp, inclusive")
+    parser.add_argument("--until", help="ISO timestamp, inclusive")
+    parser.add_argument("--action", help="only entries parsed into this action")
+    args = parser.parse_args()
+
+    for entry in iter_entries(args.dir, args.since, args.until, args.action):
+        sys.stdout.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
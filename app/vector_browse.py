@@ -0,0 +1,142 @@
+"""
+vector_browse.py
+
+Paged, filtered reads of a Chroma collection for the /vectors endpoints and
+inspection scripts. Pages are fetched with collection.get(offset, limit) so only
+one page is in memory at a time; embeddings are left out unless asked for.
+
+Query parameters understood by parse_args():
+    limit           page size (default VECTORS_PAGE_SIZE, capped at VECTORS_MAX_PAGE_SIZE)
+    offset|cursor   where to start; responses carry next_cursor for the following page
+    count           old name for limit
+    namespace       shorthand for meta.namespace=<value>
+    meta.<key>      exact-match metadata filter (repeatable across keys)
+    fields          comma list of ids,documents,metadatas,embeddings (default: all but embeddings)
+    format          json (one page) or ndjson (stream every match from the cursor on)
+"""
+
+import json
+
+from app.config import VECTORS_PAGE_SIZE, VECTORS_MAX_PAGE_SIZE
+
+FIELDS = ("ids", "documents", "metadatas", "embeddings")
+DEFAULT_FIELDS = ("ids", "documents", "metadatas")
+
+
+class VectorQueryError(ValueError):
+    """Raised for malformed /vectors query parameters."""
+
+
+def _coerce(value):
+    """
+    Query strings are text; metadata is stored typed. Match ints, floats and booleans too.
+    """
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def build_where(filters):
+    """
+    Turn {key: value} exact-match filters into a Chroma where clause (or None).
+    """
+    conditions = [{key: value} for key, value in sorted(filters.items())]
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def parse_args(args):
+    """
+    Parse request query parameters (any mapping with .get and .items) into browse options.
+    """
+    try:
+        limit = int(args.get("limit") or args.get("count") or VECTORS_PAGE_SIZE)
+        offset = int(args.get("cursor") or args.get("offset") or 0)
+    except ValueError:
+        raise VectorQueryError("limit, count, offset and cursor must be integers")
+    if limit < 1 or offset < 0:
+        raise VectorQueryError("limit must be positive and offset non-negative")
+
+    fields = tuple(f.strip() for f in (args.get("fields") or ",".join(DEFAULT_FIELDS)).split(",") if f.strip())
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise VectorQueryError(f"unknown field(s): {', '.join(unknown)}")
+
+    filters = {key[len("meta."):]: _coerce(value) for key, value in args.items() if key.startswith("meta.")}
+    if args.get("namespace"):
+        filters["namespace"] = args.get("namespace")
+
+    stream = (args.get("format") or "json").lower() == "ndjson"
+    return {
+        "limit": min(limit, VECTORS_MAX_PAGE_SIZE),
+        "offset": offset,
+        "where": build_where(filters),
+        "fields": fields,
+        # An explicit limit bounds a stream too; otherwise stream everything that matches
+        "max_entries": limit if stream and (args.get("limit") or args.get("count")) else None,
+        "stream": stream
+    }
+
+
+def fetch_page(collection, offset=0, limit=VECTORS_PAGE_SIZE, where=None, fields=DEFAULT_FIELDS):
+    """
+    Return (entries, next_cursor). next_cursor is None once the last page has been read.
+    """
+    include = [f for f in fields if f != "ids"]
+    results = collection.get(where=where, limit=limit, offset=offset, include=include)
+    ids = results.get("ids") or []
+
+    entries = []
+    for i, _id in enumerate(ids):
+        entry = {"id": _id} if "ids" in fields else {}
+        if "documents" in fields:
+            entry["document"] = results["documents"][i]
+        if "metadatas" in fields:
+            entry["metadata"] = results["metadatas"][i]
+        if "embeddings" in fields:
+            embedding = results["embeddings"][i]
+            entry["embedding"] = embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+        entries.append(entry)
+
+    next_cursor = offset + len(ids) if len(ids) == limit else None
+    return entries, next_cursor
+
+
+def iter_entries(collection, offset=0, page_size=VECTORS_PAGE_SIZE, where=None, fields=DEFAULT_FIELDS,
+                 max_entries=None):
+    """
+    Yield entries page by page starting at `offset`, up to `max_entries` if given.
+    """
+    remaining = max_entries
+    while offset is not None:
+        limit = page_size if remaining is None else min(page_size, remaining)
+        if limit <= 0:
+            return
+        entries, offset = fetch_page(collection, offset, limit, where, fields)
+        yield from entries
+        if remaining is not None:
+            remaining -= len(entries)
+
+
+def page_body(collection, options):
+    entries, next_cursor = fetch_page(collection, options["offset"], options["limit"],
+                                      options["where"], options["fields"])
+    return {"entries": entries, "count": len(entries), "offset": options["offset"], "next_cursor": next_cursor}
+
+
+def ndjson_lines(collection, options):
+    """
+    One JSON object per line for every matching entry, for streaming responses.
+    """
+    for entry in iter_entries(collection, options["offset"], options["limit"], options["where"],
+                              options["fields"], options["max_entries"]):
+        yield json.dumps(entry, default=str) + "\n"
@@ -0,0 +1,235 @@
+"""
+vector_store.py
+
+Where the Chroma collections live. Each tenant (see app/tenancy.py) has its own
+store; the default tenant keeps the original vector_store/jarvis_memory. By default
+each process opens stores itself, on first use. In pre-fork mode (app/prefork.py) a
+single owner process holds every client and workers reach it over a local
+multiprocessing.managers RPC, so only one process ever opens a store on disk.
+
+Every collection call names its tenant and goes through one LRU of open stores
+(TenantStores): locally, or inside the owner. Nothing hands out long-lived
+collection objects, so once a store is evicted nobody can keep using it behind the
+LRU's back. Reads on a tenant store that doesn't exist yet return empty results
+instead of creating it. Writes stamp the store directory (.last_write), which
+app/snapshot.py uses to tell whether a snapshot is still as new as the store.
+
+memory_manager.collection is a CollectionHandle bound to the current tenant, so
+module-level code can keep calling collection.query(...) / .upsert(...) unchanged.
+"""
+
+import functools
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from app.jarvis_logger import logger
+from app.tenancy import ShardCache, current_tenant, is_default, vector_dir
+
+DB_DIR = "vector_store"
+COLLECTION_NAME = "jarvis_memory"
+
+# Set by the pre-fork parent for its workers
+OWNER_ADDRESS_ENV = "JARVIS_CHROMA_ADDRESS"
+OWNER_AUTHKEY_ENV = "JARVIS_CHROMA_AUTHKEY"
+
+COLLECTION_METHODS = ("add", "upsert", "update", "delete", "get", "query", "count", "peek")
+READ_METHODS = ("get", "query", "count", "peek")
+WRITE_STAMP_FILE = ".last_write"
+
+
+def open_local_collection(db_dir=DB_DIR, name=COLLECTION_NAME):
+    return open_local_store(db_dir, name)[1]
+
+
+def open_local_store(db_dir=DB_DIR, name=COLLECTION_NAME):
+    """
+    Return (client, collection) for a store directory.
+    """
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.Client(Settings(chroma_db_impl="duckdb+parquet", persist_directory=db_dir))
+    return client, client.get_or_create_collection(name)
+
+
+def open_tenant_store(tenant):
+    return open_local_store(vector_dir(tenant, DB_DIR))
+
+
+def close_store(store):
+    # duckdb+parquet clients only write to disk on persist(); newer clients persist as they go
+    client = store[0]
+    if hasattr(client, "persist"):
+        client.persist()
+
+
+def mark_written(db_dir):
+    """
+    Record that the store in db_dir just changed. Snapshots exported before this are stale.
+    """
+    os.makedirs(db_dir, exist_ok=True)
+    path = os.path.join(db_dir, WRITE_STAMP_FILE)
+    with open(path + ".tmp", "w") as f:
+        f.write(repr(time.time()))
+    os.replace(path + ".tmp", path)
+
+
+def last_written(db_dir):
+    """
+    When the store in db_dir was last written through TenantStores, or None if never.
+    """
+    try:
+        with open(os.path.join(db_dir, WRITE_STAMP_FILE)) as f:
+            return float(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def store_exists(tenant):
+    return is_default(tenant) or os.path.isdir(vector_dir(tenant, DB_DIR))
+
+
+def empty_result(method, kwargs):
+    """
+    What a read returns for a tenant without a store, shaped like Chroma's results.
+    """
+    if method == "count":
+        return 0
+    if method == "query":
+        queries = len(kwargs.get("query_embeddings") or kwargs.get("query_texts") or [None])
+        return {key: [[] for _ in range(queries)] for key in ("ids", "documents", "metadatas", "distances")}
+    return {"ids": [], "embeddings": None, "documents": [], "metadatas": []}
+
+
+class TenantStores:
+    """
+    Every tenant's store behind one LRU. call() leases the store for the duration
+    of a single collection method, so eviction never closes a store mid-call.
+    """
+
+    def __init__(self, opener=open_tenant_store, closer=close_store):
+        self._cache = ShardCache(opener, closer=closer)
+
+    def call(self, tenant, method, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        if method not in COLLECTION_METHODS:
+            raise AttributeError(f"Unsupported collection method: {method}")
+        if method in READ_METHODS and not store_exists(tenant):
+            return empty_result(method, kwargs)
+        with self._cache.lease(tenant) as store:
+            try:
+                return getattr(store[1], method)(*args, **kwargs)
+            finally:
+                # Stamped after the write lands, so an export that started earlier is seen as stale
+                if method not in READ_METHODS:
+                    mark_written(vector_dir(tenant, DB_DIR))
+
+
+# Only used inside the owner process
+_owner_stores = None
+_owner_lock = threading.Lock()
+
+
+def _owner():
+    global _owner_stores
+    with _owner_lock:
+        if _owner_stores is None:
+            _owner_stores = TenantStores()
+        return _owner_stores
+
+
+class ChromaManager(BaseManager):
+    pass
+
+
+# One shared object; each call carries its tenant and resolves through the owner's LRU
+ChromaManager.register("stores", callable=_owner, exposed=("call",))
+
+
+def start_owner(address, authkey, ctx=None):
+    """
+    Start the Chroma owner process listening on `address` (a Unix socket path).
+    Returns the started manager; call .shutdown() to stop it.
+    """
+    manager = ChromaManager(address=address, authkey=authkey, ctx=ctx)
+    manager.start()
+    logger.info(f"[VECTOR] → Chroma owner started at {address}")
+    return manager
+
+
+def _connect_owner(address, authkey):
+    manager = ChromaManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.stores()
+
+
+def default_backend():
+    """
+    Return the object whose call(tenant, method, args, kwargs) runs collection methods:
+    the pre-fork owner if one is configured in the environment, else local stores.
+    """
+    address = os.environ.get(OWNER_ADDRESS_ENV)
+    if address:
+        return _connect_owner(address, bytes.fromhex(os.environ[OWNER_AUTHKEY_ENV]))
+    return TenantStores()
+
+
+class TenantCollection:
+    """
+    One tenant's collection, as seen through a CollectionHandle. Holds no store
+    itself: each method call goes through the LRU.
+    """
+
+    def __init__(self, handle, tenant):
+        self._handle = handle
+        self.tenant = tenant
+
+    def __getattr__(self, name):
+        if name not in COLLECTION_METHODS:
+            raise AttributeError(name)
+        return functools.partial(self._handle.call, self.tenant, name)
+
+
+class CollectionHandle:
+    """
+    Stand-in for the current tenant's Chroma collection. The backend is created per
+    process: after a fork the child builds its own instead of sharing the parent's.
+    """
+
+    def __init__(self, backend_factory=default_backend):
+        self._backend_factory = backend_factory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._backend = None
+
+    def _resolve_backend(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._backend = self._backend_factory()
+                    self._pid = os.getpid()
+        return self._backend
+
+    def call(self, tenant, method, *args, **kwargs):
+        return self._resolve_backend().call(tenant or current_tenant(), method, args, kwargs)
+
+    def resolve(self, tenant=None):
+        """
+        The given (or current) tenant's collection, fixed to that tenant.
+        """
+        return TenantCollection(self, tenant or current_tenant())
+
+    def swap(self, backend_factory):
+        """
+        Point the handle at a different backend; it is resolved on next use.
+        """
+        with self._lock:
+            self._backend_factory = backend_factory
+            self._pid = None
+            self._backend = None
+
+    def __getattr__(self, name):
+        if name not in COLLECTION_METHODS:
+            raise AttributeError(name)
+        return functools.partial(self.call, None, name)
@@ -1,21 +1,142 @@
 from faster_whisper import WhisperModel
 from app.jarvis_logger import logger
+from app.config import (
+    STT_PROFILES,
+    STT_DEFAULT_PROFILE,
+    STT_AUTO_FAST_MAX_SECONDS,
+    STT_PRELOAD_PROFILES,
+    STT_PRELOAD_AT_IMPORT,
+    PREFORK_ENV,
+    STT_AGREEMENT_SAMPLE_RATE
+)
+from app import stt_telemetry
+from app.metrics import timed
+from app.stt_pool import get_pool, pool_size
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import os
+import random
+import threading
 
-model = WhisperModel("small", compute_type="int8")
+SAMPLE_RATE = 16000
 
-def transcribe(audio_path):
-    if not os.path.exists(audio_path):
-        logger.error(f"[STT] → File not found: {audio_path}")
-        return ""
+_models = {}
+_models_lock = threading.Lock()
+# Background re-transcriptions for agreement sampling; one at a time so they stay cheap
+_compare_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt-compare")
 
-    segments, _ = model.transcribe(
-        audio_path,
-        language="en",
-        beam_size=5,
-        best_of=5
-    )
 
-    result_text = " ".join([seg.text.strip() for seg in segments])
+def get_model(profile):
+    """
+    Return the WhisperModel for a profile, loading it on first use.
+    Profiles that share a model/compute_type share one instance.
+    """
+    settings = STT_PROFILES[profile]
+    key = (settings["model"], settings["compute_type"])
+    with _models_lock:
+        if key not in _models:
+            workers, cpu_threads = pool_size()
+            logger.info(f"[STT] → Loading Whisper model {key[0]} ({key[1]}) for profile '{profile}' "
+                        f"with {workers} worker(s) x {cpu_threads} thread(s)")
+            _models[key] = WhisperModel(key[0], compute_type=key[1], cpu_threads=cpu_threads, num_workers=workers)
+        return _models[key]
+
+
+def preload_models():
+    for profile in STT_PRELOAD_PROFILES:
+        get_model(profile)
+
+
+def loaded_models():
+    with _models_lock:
+        return list(_models)
+
+
+# Read at import time, not from config: the pre-fork parent sets this after config is loaded
+if STT_PRELOAD_AT_IMPORT and os.environ.get(PREFORK_ENV) != "1":
+    preload_models()
+
+
+def resolve_profile(profile, audio=None):
+    """
+    Map a requested profile (None, "auto", or a name) to a concrete profile name.
+    "auto" picks fast for short in-memory clips; file paths have no cheap duration, so use accurate.
+    """
+    profile = profile or STT_DEFAULT_PROFILE
+    if profile in STT_PROFILES:
+        return profile
+    if profile != "auto":
+        logger.warning(f"[STT] → Unknown profile '{profile}', using auto")
+    if isinstance(audio, np.ndarray) and len(audio) / SAMPLE_RATE <= STT_AUTO_FAST_MAX_SECONDS:
+        return "fast"
+    return "accurate"
+
+
+def transcribe_timed(audio, initial_prompt=None, profile=None):
+    """
+    Transcribe a file path or 16 kHz float32 array, yielding faster-whisper segments
+    (with .start/.end in seconds) lazily as they are decoded. Records the profile's
+    real-time factor once all segments have been consumed.
+    Decoding runs on the STT worker pool; queue waits count toward the job timeout.
+    """
+    profile = resolve_profile(profile, audio)
+    settings = STT_PROFILES[profile]
+
+    def job(emit):
+        with timed("stt") as t:
+            segments, info = get_model(profile).transcribe(
+                audio,
+                language="en",
+                beam_size=settings["beam_size"],
+                best_of=settings["best_of"],
+                vad_filter=settings["vad_filter"],
+                condition_on_previous_text=settings["condition_on_previous_text"],
+                initial_prompt=initial_prompt
+            )
+            for seg in segments:
+                if not emit(seg):
+                    return
+        stt_telemetry.record_run(profile, info.duration, t.elapsed)
+
+    yield from get_pool().stream(job)
+
+
+def _compare_profiles(audio, profile, text):
+    other = "accurate" if profile == "fast" else "fast"
+    if other not in STT_PROFILES:
+        return
+    other_text = " ".join(seg.text.strip() for seg in transcribe_timed(audio, profile=other)).strip()
+    # Agreement is always measured against the more accurate transcript
+    if other == "accurate":
+        stt_telemetry.record_agreement(profile, text, other, other_text)
+    else:
+        stt_telemetry.record_agreement(other, other_text, profile, text)
+
+
+def transcribe_segments(audio, profile=None):
+    """
+    Yield finalized segment texts as faster-whisper decodes them, so callers can
+    start downstream work before the whole clip is transcribed.
+    `audio` is a file path or an in-memory 16 kHz float32 array.
+    """
+    if isinstance(audio, str) and not os.path.exists(audio):
+        logger.error(f"[STT] → File not found: {audio}")
+        return
+
+    profile = resolve_profile(profile, audio)
+    texts = []
+    for seg in transcribe_timed(audio, profile=profile):
+        text = seg.text.strip()
+        if text:
+            texts.append(text)
+            yield text
+
+    # Only in-memory clips: a fallback temp file is gone by the time the comparison runs
+    if isinstance(audio, np.ndarray) and random.random() < STT_AGREEMENT_SAMPLE_RATE:
+        _compare_executor.submit(_compare_profiles, audio, profile, " ".join(texts))
+
+
+def transcribe(audio, profile=None):
+    result_text = " ".join(transcribe_segments(audio, profile))
     logger.info(f"[STT] → Result: {result_text}")
     return result_text.strip()
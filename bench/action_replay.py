@@ -0,0 +1,266 @@
+"""
+action_replay.py
+
+Replay benchmark for the action layer (app.intent_router → app.action_handler →
+app.io_utils). Parsed intents, either synthetic or recorded in the training log,
+are fed through route_intent against generated inventories of 1k–100k rows. The
+result is reported per storage mode and per action: ops/sec, latency percentiles,
+peak traced memory and data-file bytes written.
+
+No LLM is involved (intents are already parsed). app.memory_manager is replaced by
+an in-process stub, so the embedding model and Chroma are never loaded.
+
+Usage:
+    python -m bench.action_replay --rows 1000 10000 100000 --ops 200
+    python -m bench.action_replay --modes compact_atomic --training-log logs/training
+    python -m bench.action_replay --intents intents.jsonl --json replay.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from collections import defaultdict
+
+from bench.latency_bench import percentile
+
+ROOMS = ["kitchen", "garage", "hall", "bedroom", "office", "bathroom", "attic"]
+LOCATIONS = ["top shelf", "drawer", "cabinet", "box", "desk", "cupboard", "rack"]
+WORDS = ["red", "spare", "old", "small", "metal", "blue", "long", "new", "usb", "paper"]
+THINGS = ["screwdriver", "cable", "battery", "charger", "tape", "hammer", "notebook",
+          "scissors", "torch", "glue", "bulb", "key", "adapter", "pen", "wrench"]
+
+# Synthetic workload: (action, weight)
+DEFAULT_MIX = [
+    ("add_inventory", 30),
+    ("update_inventory", 20),
+    ("remove_inventory", 10),
+    ("query_inventory", 5),
+    ("remove_last_inventory", 5),
+    ("add_shopping", 10),
+    ("remove_shopping", 5),
+    ("add_todo", 10),
+    ("remove_last_todo", 5)
+]
+
+
+def install_memory_stub():
+    """
+    Register a stand-in app.memory_manager before the action layer imports it.
+    Signatures match the real module so call-site mistakes still fail.
+    """
+    stub = types.ModuleType("app.memory_manager")
+    stub.calls = defaultdict(int)
+
+    def add_to_memory(namespace, data):
+        stub.calls["add_to_memory"] += 1
+
+    def query_memory(user_input, namespace, top_k=3):
+        stub.calls["query_memory"] += 1
+        return []
+
+    stub.add_to_memory = add_to_memory
+    stub.query_memory = query_memory
+    sys.modules["app.memory_manager"] = stub
+    return stub
+
+
+def item_name(rng):
+    return f"{rng.choice(WORDS)} {rng.choice(THINGS)} {rng.randrange(1_000_000):06d}"
+
+
+def generate_data(rows, seed):
+    rng = random.Random(seed)
+    inventory = [{
+        "item": item_name(rng),
+        "location": rng.choice(LOCATIONS),
+        "room": rng.choice(ROOMS),
+        "quantity": rng.randint(1, 5)
+    } for _ in range(rows)]
+    shopping = [{"item": rng.choice(THINGS), "quantity": 1} for _ in range(max(10, rows // 100))]
+    todo = [{"task": f"task {i}", "date": ""} for i in range(max(10, rows // 100))]
+    return {"inventory": inventory, "shopping": shopping, "todo": todo}
+
+
+def synthetic_intents(data, count, seed):
+    rng = random.Random(seed + 1)
+    actions, weights = zip(*DEFAULT_MIX)
+    known = [entry["item"] for entry in data["inventory"]]
+    intents = []
+    for _ in range(count):
+        action = rng.choices(actions, weights)[0]
+        if action == "add_inventory":
+            intents.append({"action": action, "item": item_name(rng), "room": rng.choice(ROOMS),
+                            "location": rng.choice(LOCATIONS)})
+        elif action == "update_inventory":
+            intents.append({"action": action, "item": rng.choice(known), "room": rng.choice(ROOMS),
+                            "location": rng.choice(LOCATIONS)})
+        elif action == "remove_inventory":
+            intents.append({"action": action, "item": rng.choice(known)})
+        elif action in ("add_shopping", "remove_shopping"):
+            intents.append({"action": action, "item": rng.choice(THINGS)})
+        elif action == "add_todo":
+            intents.append({"action": action, "task": f"task {rng.randrange(10_000)}"})
+        else:
+            intents.append({"action": action})
+    return intents
+
+
+def recorded_intents(path):
+    """
+    Parsed intents from a JSON-lines file (one intent per line) or a training log directory.
+    """
+    if os.path.isdir(path):
+        from app.training_log import iter_entries
+        return [e["llm_response_json"] for e in iter_entries(path)
+                if isinstance(e.get("llm_response_json"), dict) and e["llm_response_json"].get("action")]
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class Replay:
+    def __init__(self, workdir):
+        install_memory_stub()
+        from app import io_utils, action_handler, intent_router
+        self.io_utils = io_utils
+        self.route_intent = intent_router.route_intent
+        self.bytes_written = 0
+        self.workdir = workdir
+
+        io_utils.DATA_FILES.update({key: os.path.join(workdir, f"{key}.json") for key in io_utils.DATA_FILES})
+        original_write = action_handler.write_json
+
+        def counting_write(key, payload):
+            original_write(key, payload)
+            self.bytes_written += os.path.getsize(io_utils.DATA_FILES[key])
+
+        action_handler.write_json = counting_write
+
+    def load(self, data, mode):
+        self.io_utils.STORAGE_MODE = mode
+        for key, rows in data.items():
+            with open(self.io_utils.DATA_FILES[key], "w") as f:
+                json.dump(rows, f, indent=2 if mode == "pretty" else None)
+
+    def run(self, intents, trace_memory=False):
+        """
+        Execute intents in order; returns one sample dict per intent.
+        """
+        samples = []
+        for intent in intents:
+            # route_intent mutates its argument (memory_context), so replay a copy
+            intent = dict(intent)
+            before = self.bytes_written
+            if trace_memory:
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            ok = True
+            try:
+                self.route_intent(intent)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            samples.append({
+                "action": intent.get("action", "?"),
+                "ok": ok,
+                "latency": elapsed,
+                "bytes": self.bytes_written - before,
+                "peak": tracemalloc.get_traced_memory()[1] if trace_memory else None
+            })
+        return samples
+
+
+def summarize(samples, memory_samples):
+    by_action = defaultdict(list)
+    for s in samples:
+        by_action[s["action"]].append(s)
+    peaks = defaultdict(list)
+    for s in memory_samples:
+        peaks[s["action"]].append(s["peak"])
+
+    rows = {}
+    for action, group in sorted(by_action.items()):
+        latencies = [s["latency"] for s in group]
+        total = sum(latencies)
+        rows[action] = {
+            "count": len(group),
+            "errors": sum(1 for s in group if not s["ok"]),
+            "ops_per_sec": round(len(group) / total, 1) if total else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "bytes_per_op": round(sum(s["bytes"] for s in group) / len(group)),
+            "peak_mem_kb": round(max(peaks[action]) / 1024) if peaks.get(action) else None
+        }
+    return rows
+
+
+def print_table(rows_count, mode, rows):
+    print(f"\n== {rows_count} rows, storage mode: {mode} ==")
+    print(f"{'action':<24}{'count':>7}{'err':>5}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'bytes/op':>12}{'peak KB':>10}")
+    for action, r in rows.items():
+        print(f"{action:<24}{r['count']:>7}{r['errors']:>5}{r['ops_per_sec'] or '-':>10}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['bytes_per_op']:>12}{r['peak_mem_kb'] or '-':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JARVIS action-layer replay benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ops", type=int, default=200, help="synthetic intents per run")
+    parser.add_argument("--memory-ops", type=int, default=30,
+                        help="intents replayed again under tracemalloc for peak memory (0 to skip)")
+    parser.add_argument("--modes", nargs="+", default=["pretty", "compact_atomic"])
+    parser.add_argument("--intents", help="JSON-lines file of parsed intents, or a training log directory")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write all results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="jarvis-replay-")
+    replay = Replay(workdir)
+    unknown = [m for m in args.modes if m not in replay.io_utils.STORAGE_MODES]
+    if unknown:
+        parser.error(f"unknown storage mode(s): {', '.join(unknown)}")
+
+    recorded = recorded_intents(args.intents) if args.intents else None
+    results = []
+    try:
+        for rows_count in args.rows:
+            data = generate_data(rows_count, args.seed)
+            intents = recorded or synthetic_intents(data, args.ops, args.seed)
+            for mode in args.modes:
+                replay.load(data, mode)
+                start = time.perf_counter()
+                samples = replay.run(intents)
+                wall = time.perf_counter() - start
+
+                memory_samples = []
+                if args.memory_ops:
+                    replay.load(data, mode)
+                    tracemalloc.start()
+                    try:
+                        memory_samples = replay.run(intents[:args.memory_ops], trace_memory=True)
+                    finally:
+                        tracemalloc.stop()
+
+                rows = summarize(samples, memory_samples)
+                print_table(rows_count, mode, rows)
+                print(f"overall: {len(samples)} ops in {wall:.2f}s ({len(samples) / wall:.1f} ops/s)")
+                results.append({"rows": rows_count, "mode": mode, "ops": len(samples),
+                                "wall_sec": round(wall, 3), "actions": rows})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+fake_ollama.py
+
+Local stand-in for Ollama's /api/generate so the /command and /stt pipeline can be
+benchmarked without a live model. Supports streaming and non-streaming replies,
+configurable per-token latency, a simulated cold load, and canned JSON responses
+picked by matching the user's instruction inside the prompt.
+
+Usage:
+    python -m bench.fake_ollama --port 11435 --token-latency 0.02
+    JARVIS_OLLAMA_URL=http://localhost:11435/api/generate python -m app.run
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# (pattern, response) pairs tried in order against the extracted user instruction
+DEFAULT_RESPONSES = [
+    (r"\blast\b.*\btodo|\btodo\b.*\blast\b", {"action": "remove_last_todo"}),
+    (r"\blast\b.*\bshopping|\bshopping\b.*\blast\b", {"action": "remove_last_shopping"}),
+    (r"\blast\b", {"action": "remove_last_inventory"}),
+    (r"^(show|list|what).*\bshopping\b", {"action": "query_shopping"}),
+    (r"^(show|list|what).*\btodo", {"action": "query_todo"}),
+    (r"\bremind\b|\btodo\b", {"action": "add_todo", "task": "benchmark task"}),
+    (r"\bshopping\b|\bbuy\b", {"action": "add_shopping", "item": "milk", "quantity": 1}),
+    (r"\bremove\b|\bdelete\b", {"action": "remove_inventory", "item": "screwdriver"}),
+    (r"\bmove\b|\bupdate\b", {"action": "update_inventory", "item": "screwdriver", "location": "drawer", "room": "hall"}),
+    (r"^(where|what|show|list)\b", {"action": "query_inventory"}),
+    (r".*", {"action": "add_inventory", "item": "screwdriver", "location": "shelf", "room": "kitchen", "quantity": 1})
+]
+
+# Both prompt templates put the live command after one of these markers
+_INSTRUCTION_RE = re.compile(r"(?:User said:|USER INSTRUCTION:)\s*\n(.*?)(?:\n\s*\n|\Z)", re.S)
+
+
+def extract_instruction(prompt):
+    """
+    Pull the user's command out of a full JARVIS prompt (last marker wins, so
+    few-shot examples earlier in the prompt are skipped).
+    """
+    matches = _INSTRUCTION_RE.findall(prompt or "")
+    return matches[-1].strip() if matches else (prompt or "").strip()[-200:]
+
+
+def load_responses(path):
+    """
+    Load canned responses from a JSON file: [{"match": "<regex>", "response": {...} | "text"}].
+    """
+    with open(path, "r") as f:
+        entries = json.load(f)
+    return [(entry["match"], entry["response"]) for entry in entries]
+
+
+def pick_response(instruction, responses):
+    for pattern, response in responses:
+        if re.search(pattern, instruction, re.I):
+            return response if isinstance(response, str) else json.dumps(response)
+    return "{}"
+
+
+def tokenize(text):
+    """
+    Rough stand-in for model tokens: words plus their trailing whitespace/punctuation.
+    """
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class FakeOllamaState:
+    def __init__(self, model, token_latency, first_token_latency, load_latency, responses):
+        self.model = model
+        self.token_latency = token_latency
+        self.first_token_latency = first_token_latency
+        self.load_latency = load_latency
+        self.responses = responses
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def ensure_loaded(self):
+        with self.lock:
+            self.requests += 1
+            if self.loaded:
+                return 0.0
+            self.loaded = True
+        time.sleep(self.load_latency)
+        return self.load_latency
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            models = [{"name": self.state.model}] if self.state.loaded else []
+            return self._send_json(200, {"models": models})
+        if self.path == "/api/tags":
+            return self._send_json(200, {"models": [{"name": self.state.model}]})
+        body = b"Ollama is running"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            return self._send_json(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._send_json(400, {"error": "invalid JSON"})
+
+        start = time.monotonic()
+        load_duration = self.state.ensure_loaded()
+        prompt = payload.get("prompt")
+        model = payload.get("model", self.state.model)
+
+        # Empty prompt is Ollama's "load / keep-alive" request
+        if not prompt:
+            return self._send_json(200, {
+                "model": model, "created_at": _now(), "response": "",
+                "done": True, "done_reason": "load"
+            })
+
+        text = pick_response(extract_instruction(prompt), self.state.responses)
+        tokens = tokenize(text)
+        time.sleep(self.state.first_token_latency)
+
+        final = {
+            "model": model, "created_at": _now(), "response": "", "done": True,
+            "done_reason": "stop",
+            "load_duration": int(load_duration * 1e9),
+            "prompt_eval_count": len(tokenize(prompt)),
+            "eval_count": len(tokens)
+        }
+
+        if payload.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(self.state.token_latency)
+                self._write_chunk({"model": model, "created_at": _now(), "response": token, "done": False})
+            final["total_duration"] = int((time.monotonic() - start) * 1e9)
+            self._write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            time.sleep(self.state.token_latency * len(tokens))
+            final["response"] = text
+            final["total_duration"] = int((time.monotonic() - start) * 1e9)
+            self._send_json(200, final)
+
+    def _write_chunk(self, body):
+        data = json.dumps(body).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=11435, model="mistral", token_latency=0.02,
+                first_token_latency=0.05, load_latency=0.0, responses=None):
+    """
+    Build (but don't start) a threaded stand-in server. Port 0 picks a free port.
+    """
+    state = FakeOllamaState(model, token_latency, first_token_latency, load_latency,
+                            responses or DEFAULT_RESPONSES)
+    handler = type("BoundFakeOllamaHandler", (FakeOllamaHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(**kwargs):
+    """
+    Start a stand-in server on a daemon thread. Returns (server, generate_url).
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/api/generate"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Ollama stand-in for benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="mistral")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per generated token")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="prompt evaluation delay")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="simulated cold model load")
+    parser.add_argument("--responses", help="JSON file of canned responses")
+    args = parser.parse_args()
+
+    responses = load_responses(args.responses) if args.responses else None
+    server = make_server(args.host, args.port, args.model, args.token_latency,
+                         args.first_token_latency, args.load_latency, responses)
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}/api/generate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+latency_bench.py
+
+End-to-end latency benchmark for the /command and /stt pipeline.
+Drives app.server or master_script in-process (Flask test client) under concurrent
+load against the local Ollama stand-in, and reports p50/p95/p99 per stage
+(STT, retrieval, LLM, action) plus throughput.
+
+The target runs in a scratch working directory (data files, vector store, logs and
+training log all resolve there), seeded with a copy of data/, so benchmark commands
+never touch the household's real data. Pass --workdir to keep the scratch directory.
+
+Usage:
+    python -m bench.latency_bench --target app --requests 200 --concurrency 8
+    python -m bench.latency_bench --target master --audio samples/ --token-latency 0.03
+    python -m bench.latency_bench --ollama-url http://localhost:11434/api/generate   # real Ollama
+"""
+
+import argparse
+import functools
+import glob
+import importlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STAGES = ["stt", "retrieval", "llm", "action"]
+
+DEFAULT_COMMANDS = [
+    "add screwdriver to the kitchen shelf",
+    "move the screwdriver to the hall drawer",
+    "where is the screwdriver",
+    "add milk to the shopping list",
+    "show my shopping list",
+    "remind me to pay the electricity bill",
+    "show my todo list",
+    "remove the last todo"
+]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_local = threading.local()
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile; None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _record(stage, seconds):
+    stages = getattr(_local, "stages", None)
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def _timed(stage, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record(stage, time.perf_counter() - start)
+    return wrapper
+
+
+def use_scratch_dir(workdir):
+    """
+    Make `workdir` the current directory, seeded with a copy of the repo's data files.
+    Every data path in the app is relative, so this must happen before the target is imported.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    source = os.path.join(REPO_ROOT, "data")
+    if os.path.isdir(source):
+        shutil.copytree(source, os.path.join(workdir, "data"), dirs_exist_ok=True)
+    # Keep the repo importable once it is no longer the current directory
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+
+
+def load_target(name):
+    """
+    Import the server under test and return (flask_app, command_field, stage_source).
+    app.server reports its own per-stage timings in the response; master_script is
+    instrumented by wrapping its stage functions.
+    """
+    if name == "app":
+        from app import llm_handler
+        llm_handler.PROMPT_TEMPLATE_PATH = os.path.join(REPO_ROOT, "app", "prompt_template.txt")
+        module = importlib.import_module("app.server")
+        return module.app, "command", "response"
+
+    module = importlib.import_module("master_script")
+    module.transcribe = _timed("stt", module.transcribe)
+    module.query_memory = _timed("retrieval", module.query_memory)
+    module.update_memory = _timed("action", module.update_memory)
+    # LLM time is query_llm minus the retrieval and memory-save work inside it
+    module.query_llm = _timed("_query_llm", module.query_llm)
+    return module.app, "text", "wrapped"
+
+
+def _stage_times(source, body, recorded):
+    if source == "response":
+        timings = (body or {}).get("timings", {})
+        return {stage: timings[stage] for stage in STAGES if timings.get(stage) is not None}
+    stages = {k: v for k, v in recorded.items() if k in STAGES}
+    if "_query_llm" in recorded:
+        stages["llm"] = max(0.0, recorded["_query_llm"] - stages.get("retrieval", 0.0) - stages.get("action", 0.0))
+    return stages
+
+
+def run_one(client, kind, payload, command_field, source):
+    _local.stages = {}
+    start = time.perf_counter()
+    try:
+        if kind == "stt":
+            with open(payload, "rb") as f:
+                res = client.post("/stt", data={"audio": (f, os.path.basename(payload))},
+                                  content_type="multipart/form-data")
+        else:
+            res = client.post("/command", json={command_field: payload})
+        total = time.perf_counter() - start
+        body = res.get_json(silent=True)
+        ok = res.status_code < 400
+    except Exception as e:
+        total = time.perf_counter() - start
+        body, ok = {"error": str(e)}, False
+    stages = _stage_times(source, body, _local.stages)
+    _local.stages = None
+    return {"kind": kind, "ok": ok, "total": total, "stages": stages}
+
+
+def run_load(flask_app, jobs, concurrency, command_field, source):
+    clients = threading.local()
+
+    def worker(job):
+        if not hasattr(clients, "client"):
+            clients.client = flask_app.test_client()
+        return run_one(clients.client, job[0], job[1], command_field, source)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, jobs))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall):
+    summary = {"requests": len(results), "errors": sum(1 for r in results if not r["ok"]),
+               "wall_sec": round(wall, 3),
+               "throughput_rps": round(len(results) / wall, 2) if wall else None,
+               "stages": {}}
+    for stage in STAGES + ["total"]:
+        values = [r["total"] if stage == "total" else r["stages"].get(stage) for r in results]
+        values = [v for v in values if v is not None]
+        if not values:
+            continue
+        summary["stages"][stage] = {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 4),
+            "p95": round(percentile(values, 95), 4),
+            "p99": round(percentile(values, 99), 4)
+        }
+    return summary
+
+
+def print_summary(summary):
+    print(f"\nRequests: {summary['requests']}  Errors: {summary['errors']}  "
+          f"Wall: {summary['wall_sec']}s  Throughput: {summary['throughput_rps']} req/s\n")
+    print(f"{'stage':<10}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, row in summary["stages"].items():
+        print(f"{stage:<10}{row['count']:>8}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JARVIS end-to-end latency benchmark")
+    parser.add_argument("--target", choices=["app", "master"], default="app")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--commands", help="text file with one command per line")
+    parser.add_argument("--audio", help="directory of .wav clips to send to /stt")
+    parser.add_argument("--stt-ratio", type=float, default=0.5, help="share of /stt requests when --audio is set")
+    parser.add_argument("--ollama-url", help="use this Ollama instead of the local stand-in")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--json", help="write the summary to this file")
+    parser.add_argument("--workdir", help="scratch directory for the target's data (kept afterwards); "
+                                          "defaults to a temporary directory that is removed")
+    args = parser.parse_args()
+    # Resolve user-supplied paths before leaving the current directory
+    for attr in ("commands", "audio", "json", "workdir"):
+        if getattr(args, attr):
+            setattr(args, attr, os.path.abspath(getattr(args, attr)))
+
+    if args.ollama_url:
+        ollama_url = args.ollama_url
+    else:
+        from bench.fake_ollama import start_in_background
+        _, ollama_url = start_in_background(port=0, token_latency=args.token_latency,
+                                            first_token_latency=args.first_token_latency)
+    # Must be set before the server modules read their config
+    os.environ["JARVIS_OLLAMA_URL"] = ollama_url
+
+    commands = DEFAULT_COMMANDS
+    if args.commands:
+        with open(args.commands, "r") as f:
+            commands = [line.strip() for line in f if line.strip()]
+    clips = sorted(glob.glob(os.path.join(args.audio, "*.wav"))) if args.audio else []
+
+    jobs = []
+    stt_every = int(round(1 / args.stt_ratio)) if clips and args.stt_ratio > 0 else 0
+    for i in range(args.requests):
+        if stt_every and i % stt_every == 0:
+            jobs.append(("stt", clips[(i // stt_every) % len(clips)]))
+        else:
+            jobs.append(("command", commands[i % len(commands)]))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jarvis-bench-")
+    use_scratch_dir(workdir)
+    try:
+        flask_app, command_field, source = load_target(args.target)
+        print(f"Target: {args.target}  Ollama: {ollama_url}  Concurrency: {args.concurrency}  Workdir: {workdir}")
+        results, wall = run_load(flask_app, jobs, args.concurrency, command_field, source)
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    summary = summarize(results, wall)
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
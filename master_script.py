@@ -5,7 +5,6 @@
 
 import os
 import json
-import tempfile
 import time
 import logging
 import requests
@@ -15,32 +14,20 @@ from datetime import datetime
 from typing import Dict, Optional, Any
 import chromadb
 from sentence_transformers import SentenceTransformer
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from faster_whisper import WhisperModel
-
-def get_recent_logs(line_count=50):
-    try:
-        with open(log_file, "r") as f:
-            lines = f.readlines()
-        return lines[-line_count:]
-    except Exception:
-        return []
-
-os.makedirs("logs", exist_ok=True)
-log_file = "logs/jarvis.log"
-llm_memory_log_file = "logs/llm_memory_log.jsonl"
-logging.basicConfig(
-    filename=log_file,
-    filemode="a",
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-logger = logging.getLogger("jarvis")
+from app.resilience import call_with_retries, CircuitOpenError, DeadlineExceeded
+from app.offline_parser import parse_offline
+from app.audio_decode import decoded_audio
+from app.metrics import timed, render_prometheus
+from app.jarvis_logger import logger, log_payload, get_recent_logs
+from app.training_log import log_interaction
+from app.vector_browse import parse_args, page_body, ndjson_lines, VectorQueryError
+from app.snapshot import Snapshot, export_snapshot, import_snapshot
+from app.config import SNAPSHOT_DIR
 
 MODEL_NAME = "mistral"
-OLLAMA_URL = "http://localhost:11434/api/generate"
-DEBUG = False
+OLLAMA_URL = os.environ.get("JARVIS_OLLAMA_URL", "http://localhost:11434/api/generate")
 
 try:
     stt_model = WhisperModel("small", compute_type="int8")
@@ -48,14 +35,18 @@ except Exception as e:
     logger.error(f"Failed to load Whisper model: {e}. STT will not function.")
     stt_model = None
 
-def transcribe(audio_path: str) -> str:
+def transcribe(audio) -> str:
+    """
+    Transcribe a file path or an in-memory 16 kHz float32 array.
+    """
     if not stt_model:
         return "[STT model not loaded]"
-    if not os.path.exists(audio_path):
-        logger.error(f"[STT] → File not found: {audio_path}")
+    if isinstance(audio, str) and not os.path.exists(audio):
+        logger.error(f"[STT] → File not found: {audio}")
         return ""
-    segments, _ = stt_model.transcribe(audio_path, language="en", beam_size=5, best_of=5)
-    result_text = " ".join([seg.text.strip() for seg in segments])
+    with timed("stt"):
+        segments, _ = stt_model.transcribe(audio, language="en", beam_size=5, best_of=5)
+        result_text = " ".join([seg.text.strip() for seg in segments])
     logger.info(f"[STT] → Result: {result_text}")
     return result_text.strip()
 
@@ -116,7 +107,8 @@ def update_memory(document_text: str, metadata: Optional[Dict[str, Any]] = None)
 
     try:
         doc = f"user_statement: {document_text}"
-        embedding = embedding_model.encode([doc], convert_to_tensor=False)[0].tolist()
+        with timed("embedding"):
+            embedding = embedding_model.encode([doc], convert_to_tensor=False)[0].tolist()
         collection.add(documents=[doc], embeddings=[embedding], ids=[doc_id], metadatas=[metadata])
         logger.info(f"[MEMORY] Stored: {document_text}")
     except Exception as e:
@@ -125,10 +117,11 @@ def update_memory(document_text: str, metadata: Optional[Dict[str, Any]] = None)
 def query_memory(user_input: str, top_k=20) -> list:
     if not MEMORY_ENABLED: return []
     try:
-        embedding = embedding_model.encode([user_input], convert_to_tensor=False)[0].tolist()
-        query_start = time.time()
-        results = collection.query(query_embeddings=[embedding], n_results=top_k)
-        logger.info(f"[VECTOR] Query took {round(time.time() - query_start, 2)} sec")
+        with timed("embedding"):
+            embedding = embedding_model.encode([user_input], convert_to_tensor=False)[0].tolist()
+        with timed("vector_query") as t:
+            results = collection.query(query_embeddings=[embedding], n_results=top_k)
+        logger.info(f"[VECTOR] Query took {round(t.elapsed, 2)} sec")
         return results.get("documents", [[]])[0], results.get("metadatas", [[]])[0]
     except Exception as e:
         logger.error(f"[MEMORY] Failed to query memory: {e}")
@@ -138,6 +131,10 @@ def sync_memory_on_startup():
     if not MEMORY_ENABLED:
         logger.warning("[MEMORY] Sync skipped: Memory Manager is disabled.")
         return
+    if collection.count() == 0 and Snapshot.exists(SNAPSHOT_DIR):
+        logger.info(f"[MEMORY] Vector store is empty, restoring from snapshot in {SNAPSHOT_DIR}")
+        import_snapshot(collection, SNAPSHOT_DIR)
+        return
     logger.info("[MEMORY] Skipping rebuild from jsonl – using ChromaDB persistent memory.")
 
 PROMPT_TEMPLATE = """You are JARVIS, a memory-aware personal assistant. Use MEMORY CONTEXT to avoid hallucination.
@@ -200,37 +197,41 @@ def query_llm(user_input: str) -> str:
         known_facts_str = "(No known facts)"
 
     logger.info(f"[VECTOR] Retrieved {len(memory_contexts)} memory entries.")
-    prompt = PROMPT_TEMPLATE.replace("{memory_context}", memory_context_str).replace("{user_input}", user_input).replace("{known_facts}", known_facts_str)
-    if DEBUG:
-        logger.info(f"[LLM] Prompt: Injected {len(memory_contexts)} memory lines → model: {MODEL_NAME}")
-        logger.info(prompt)
+    with timed("prompt_build"):
+        prompt = PROMPT_TEMPLATE.replace("{memory_context}", memory_context_str).replace("{user_input}", user_input).replace("{known_facts}", known_facts_str)
+    logger.info(f"[LLM] Prompt: Injected {len(memory_contexts)} memory lines → model: {MODEL_NAME}")
+    log_payload("FINAL PROMPT", prompt)
     payload = {"model": MODEL_NAME, "prompt": prompt, "stream": False}
 
-    for attempt in range(3):
-        try:
-            llm_start = time.time()
-            res = requests.post(OLLAMA_URL, json=payload, timeout=20)
-            res.raise_for_status()
-            raw_response = res.json().get("response", "").strip()
-            logger.info(f"[LLM] Response took {round(time.time() - llm_start, 2)} sec → {raw_response}")
-
-            with open(llm_memory_log_file, "a") as f:
-                entry = {"user_command": user_input, "timestamp": datetime.now().isoformat()}
-                parsed_json = try_parse_json(raw_response)
-                if parsed_json:
-                    entry["llm_response_json"] = parsed_json
-                else:
-                    entry["llm_response_text"] = raw_response
-                json.dump(entry, f)
-                f.write("\n")
-
-            update_memory(user_input, metadata=parsed_json)
-            return raw_response
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"[LLM] Request error: {e}")
-            time.sleep(2)
-    return "I'm sorry, I am unable to process your request."
+    def _post(timeout):
+        res = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
+        res.raise_for_status()
+        return res.json()
+
+    try:
+        with timed("llm_call") as llm_timer:
+            data = call_with_retries(_post)
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"[LLM] Unavailable ({e}), falling back to offline parser")
+        fallback = parse_offline(user_input)
+        if fallback:
+            return json.dumps(fallback)
+        return "I'm sorry, I am unable to process your request."
+
+    raw_response = data.get("response", "").strip()
+    logger.info(f"[LLM] Response took {round(llm_timer.elapsed, 2)} sec → {raw_response}")
+
+    entry = {"user_command": user_input, "timestamp": datetime.now().isoformat()}
+    parsed_json = try_parse_json(raw_response)
+    if parsed_json:
+        entry["llm_response_json"] = parsed_json
+    else:
+        entry["llm_response_text"] = raw_response
+    log_interaction(entry)
+
+    with timed("action"):
+        update_memory(user_input, metadata=parsed_json)
+    return raw_response
 
 app = Flask(__name__)
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
@@ -245,26 +246,21 @@ def handle_stt():
     logger.info("========== START JARVIS COMMAND ==========")
     if 'audio' not in request.files:
         return jsonify({"error": "No audio file"}), 400
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmpfile:
-        request.files['audio'].save(tmpfile.name)
-        tmp_path = tmpfile.name
-    try:
+    audio_bytes = request.files['audio'].read()
+    with decoded_audio(audio_bytes) as audio:
         transcription_start = time.time()
-        transcription = transcribe(tmp_path)
+        transcription = transcribe(audio)
         transcription_duration = time.time() - transcription_start
-        logger.info(f"[STT] Received audio → Transcribed in {round(transcription_duration, 2)} sec")
-        if not transcription or transcription == "[STT model not loaded]":
-            return jsonify({"error": "STT failed or model not loaded."}), 500
-        response_message = query_llm(transcription)
-    finally:
-        os.remove(tmp_path)
+    logger.info(f"[STT] Received audio → Transcribed in {round(transcription_duration, 2)} sec")
+    if not transcription or transcription == "[STT model not loaded]":
+        return jsonify({"error": "STT failed or model not loaded."}), 500
+    response_message = query_llm(transcription)
     duration = round(time.time() - overall_start, 2)
     logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
     return jsonify({
         "transcription": transcription,
         "message": response_message,
-        "time_taken": duration,
-        "logs": get_recent_logs()
+        "time_taken": duration
     })
 
 @app.route("/command", methods=["POST"])
@@ -280,10 +276,28 @@ def handle_command():
     logger.info(f"========== END JARVIS COMMAND (Total: {duration} sec) ==========")
     return jsonify({
         "message": response_message,
-        "time_taken": duration,
-        "logs": get_recent_logs()
+        "time_taken": duration
     })
 
+@app.route("/logs", methods=["GET"])
+def recent_logs():
+    since = request.args.get("since", type=int)
+    return jsonify(get_recent_logs(since, request.args.get("limit", type=int)))
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/snapshot", methods=["POST"])
+def create_snapshot():
+    if not MEMORY_ENABLED:
+        return jsonify({"error": "Memory disabled."}), 400
+    try:
+        return jsonify(export_snapshot(collection, SNAPSHOT_DIR, source=DB_DIR))
+    except Exception as e:
+        logger.error(f"[SNAPSHOT] Export failed: {e}")
+        return jsonify({"error": "Snapshot export failed"}), 500
+
 @app.route("/restart-server", methods=["POST"])
 def restart_server():
     logger.warning("Server restart requested via frontend. Exiting.")
@@ -291,15 +305,16 @@ def restart_server():
 
 @app.route("/vectors", methods=["GET"])
 def fetch_vectors():
-    count = int(request.args.get("count", 10))
     if not MEMORY_ENABLED:
         return jsonify({"error": "Memory disabled."}), 400
     try:
-        results = collection.get(include=["metadatas", "documents"], limit=count)
-        entries = []
-        for doc, meta in zip(results.get("documents", []), results.get("metadatas", [])):
-            entries.append({"text": doc, "metadata": meta})
-        return jsonify({"entries": entries})
+        options = parse_args(request.args)
+    except VectorQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if options["stream"]:
+            return Response(stream_with_context(ndjson_lines(collection, options)), mimetype="application/x-ndjson")
+        return jsonify(page_body(collection, options))
     except Exception as e:
         logger.error(f"[VECTOR] Failed to fetch entries: {e}")
         return jsonify({"error": "Vector fetch failed"}), 500
@@ -1,22 +1,23 @@
+import sys
+
 import chromadb
-from chromadb.config import Settings
+
+from app.vector_browse import iter_entries, build_where
 
 client = chromadb.PersistentClient(path="vector_store")
 collection = client.get_or_create_collection("jarvis_memory")
 
-N = 99  # Number of recent items to inspect
+N = 99  # Number of items to inspect
+PAGE_SIZE = 25  # Entries fetched per request to the store; embeddings are not loaded
+namespace = sys.argv[1] if len(sys.argv) > 1 else None  # optional: python test_vector_contents.py inventory
 
-entries = collection.get(include=["documents", "metadatas", "embeddings"])  # embeddings optional, for debug
+where = build_where({"namespace": namespace} if namespace else {})
 
-print(f"\n🧠 Inspecting {min(N, len(entries['ids']))} entries from 'jarvis_memory':\n")
+print(f"\n🧠 Inspecting up to {N} entries from 'jarvis_memory'{f' (namespace: {namespace})' if namespace else ''}:\n")
 
-for idx, (doc, meta, _id) in enumerate(zip(
-    entries["documents"][:N],
-    entries["metadatas"][:N],
-    entries["ids"][:N]
-)):
+for idx, entry in enumerate(iter_entries(collection, page_size=PAGE_SIZE, where=where, max_entries=N)):
     print(f"--- Entry {idx+1} ---")
-    print(f"🆔 ID: {_id}")
-    print(f"📄 Document: {doc}")
-    print(f"📎 Metadata: {meta}")
-    print()
\ No newline at end of file
+    print(f"🆔 ID: {entry['id']}")
+    print(f"📄 Document: {entry['document']}")
+    print(f"📎 Metadata: {entry['metadata']}")
+    print()
@@ -0,0 +1,56 @@
+import importlib
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def ShardCache(tmp_path, monkeypatch):
+    # app.jarvis_logger writes logs/ relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("app.tenancy").ShardCache
+
+
+def test_evicted_tenant_is_not_reopened_until_closed(ShardCache):
+    events = []
+    close_started = threading.Event()
+    release_close = threading.Event()
+
+    def opener(tenant):
+        events.append(("open", tenant))
+        return tenant
+
+    cache = ShardCache(opener, capacity=1, closer=lambda handle: events.append(("close", handle)))
+    close = cache._close
+
+    def paused_close(tenant, handle):
+        # Hold the evicting thread between eviction and the closer running
+        close_started.set()
+        release_close.wait(5)
+        close(tenant, handle)
+
+    cache._close = paused_close
+    cache.get("a")
+    evictor = threading.Thread(target=cache.get, args=("b",))
+    evictor.start()
+    assert close_started.wait(5)
+
+    reacquire = threading.Thread(target=cache.get, args=("a",))
+    reacquire.start()
+    reacquire.join(0.2)
+    assert reacquire.is_alive(), "reopened 'a' while its old handle was still closing"
+
+    release_close.set()
+    evictor.join(5)
+    reacquire.join(5)
+    assert events[:4] == [("open", "a"), ("open", "b"), ("close", "a"), ("open", "a")]
+
+
+def test_leased_handle_is_reused_after_eviction(ShardCache):
+    opened, closed = [], []
+    cache = ShardCache(lambda t: opened.append(t) or object(), capacity=1, closer=closed.append)
+    with cache.lease("a") as handle:
+        cache.get("b")
+        assert not closed
+        assert cache.get("a") is handle
+    assert opened == ["a", "b"]
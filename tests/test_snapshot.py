@@ -0,0 +1,63 @@
+import importlib
+
+import pytest
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection, enough for paging, upsert and query."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for row in zip(ids, embeddings, documents, metadatas):
+            self.rows[row[0]] = row
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.rows.pop(doc_id, None)
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, where=None, limit=None, offset=0, include=None, ids=None):
+        rows = list(self.rows.values())[offset:offset + limit if limit else None]
+        return {"ids": [r[0] for r in rows], "embeddings": [r[1] for r in rows],
+                "documents": [r[2] for r in rows], "metadatas": [r[3] for r in rows]}
+
+    def query(self, query_embeddings, n_results=10, **_):
+        return {"ids": [list(self.rows)[:n_results]]}
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    # app.jarvis_logger writes logs/ relative to the working directory on import
+    monkeypatch.chdir(tmp_path)
+    vector_store = importlib.import_module("app.vector_store")
+    snapshot = importlib.reload(importlib.import_module("app.snapshot"))
+    store = FakeCollection()
+    stores = vector_store.TenantStores(opener=lambda tenant: (None, store), closer=None)
+    handle = vector_store.CollectionHandle(lambda: stores)
+    handle.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["alpha"], metadatas=[{"type": "note"}])
+    return snapshot, handle, store
+
+
+def test_snapshot_is_served_only_until_the_store_is_written(env, monkeypatch):
+    snapshot, handle, _ = env
+    monkeypatch.setattr(snapshot, "_warm_store", lambda *args: None)
+    manifest = snapshot.export_tenant_snapshot(handle)
+    assert manifest["count"] == 1
+
+    assert snapshot.query_index(handle) is not None
+    handle.upsert(ids=["b"], embeddings=[[0.0, 1.0]], documents=["beta"], metadatas=[{"type": "note"}])
+    assert snapshot.query_index(handle) is None
+
+
+def test_warm_up_does_not_restore_a_stale_snapshot(env):
+    snapshot, handle, store = env
+    snapshot.export_tenant_snapshot(handle)
+    handle.delete(ids=["a"])
+
+    tenant = snapshot.current_tenant()
+    snapshot._warm_store(tenant, handle, snapshot.load_for_tenant(tenant))
+    assert store.count() == 0